@@ -0,0 +1,78 @@
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+import streamlit as st
+from requests.adapters import HTTPAdapter
+
+# --- Configuration ---
+FASTAPI_BASE_URL = os.environ.get("FASTAPI_BASE_URL", "http://127.0.0.1:8000/v1")
+# Lists of artifacts, agents and characters change rarely; reruns within this window reuse them.
+LIST_CACHE_TTL_SECONDS = int(os.environ.get("LIST_CACHE_TTL_SECONDS", 30))
+HTTP_POOL_SIZE = int(os.environ.get("HTTP_POOL_SIZE", 20))
+
+
+class ApiClient:
+    """Thin wrapper around one keep-alive `requests.Session` shared by all Streamlit sessions."""
+
+    def __init__(self, base_url: str, pool_size: int):
+        self.base_url = base_url.rstrip("/")
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+        self.executor = ThreadPoolExecutor(max_workers=4, thread_name_prefix="api-client")
+
+    def request(self, method: str, path: str, token: str = None, **kwargs) -> requests.Response:
+        # Auth travels per request, never on the shared session.
+        headers = kwargs.pop("headers", {})
+        if token:
+            headers["Authorization"] = f"Bearer {token}"
+        return self.session.request(method, f"{self.base_url}{path}", headers=headers, **kwargs)
+
+    def get(self, path: str, token: str = None, **kwargs) -> requests.Response:
+        return self.request("GET", path, token, **kwargs)
+
+    def post(self, path: str, token: str = None, **kwargs) -> requests.Response:
+        return self.request("POST", path, token, **kwargs)
+
+    def put(self, path: str, token: str = None, **kwargs) -> requests.Response:
+        return self.request("PUT", path, token, **kwargs)
+
+    def delete(self, path: str, token: str = None, **kwargs) -> requests.Response:
+        return self.request("DELETE", path, token, **kwargs)
+
+    def get_json(self, path: str, token: str = None):
+        res = self.get(path, token)
+        res.raise_for_status()
+        return res.json()
+
+
+@st.cache_resource(show_spinner=False)
+def get_client() -> ApiClient:
+    """One client (and connection pool) per Streamlit server process."""
+    return ApiClient(FASTAPI_BASE_URL, HTTP_POOL_SIZE)
+
+
+# --- Cached list endpoints ---
+@st.cache_data(ttl=LIST_CACHE_TTL_SECONDS, show_spinner=False)
+def fetch_initial_data(token: str) -> dict:
+    """Fetches the agent and character lists in parallel. Raises `requests.RequestException` on failure."""
+    client = get_client()
+    agents, characters = client.executor.map(lambda path: client.get_json(path, token), ["/agents", "/characters/"])
+    return {"agents": agents, "characters": characters}
+
+
+@st.cache_data(ttl=LIST_CACHE_TTL_SECONDS, show_spinner=False)
+def list_artifacts(token: str) -> list:
+    return get_client().get_json("/artifacts", token)
+
+
+def invalidate_characters():
+    """Call after creating, updating or deleting a character."""
+    fetch_initial_data.clear()
+
+
+def invalidate_artifacts():
+    """Call after uploading a document."""
+    list_artifacts.clear()
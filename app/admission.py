@@ -0,0 +1,221 @@
+import os
+import math
+import time
+import asyncio
+from collections import deque
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, Dict, Hashable, Optional
+
+from fastapi import HTTPException, status
+from fastapi.responses import StreamingResponse
+
+from . import metrics
+
+# Per-user buckets that are full again carry no state worth keeping; prune past this size.
+MAX_TRACKED_USERS = 10000
+
+
+class TokenBucket:
+    def __init__(self, rate: float, burst: float):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = burst
+        self.updated = time.monotonic()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def retry_after(self) -> float:
+        """Seconds until one token is available (0 if one is available now)."""
+        self._refill()
+        return 0.0 if self.tokens >= 1 else (1 - self.tokens) / self.rate
+
+    def consume(self):
+        self.tokens -= 1
+
+    def is_full(self) -> bool:
+        self._refill()
+        return self.tokens >= self.burst
+
+
+class AdmissionSlot:
+    """A granted unit of concurrency. Releasing is idempotent."""
+
+    def __init__(self, pool: "AdmissionPool"):
+        self._pool = pool
+        self._loop = asyncio.get_running_loop()
+        self._started = time.monotonic()
+        self._released = False
+
+    def release(self):
+        try:
+            on_loop = asyncio.get_running_loop() is self._loop
+        except RuntimeError:
+            on_loop = False
+        if not on_loop:
+            # Pool state and waiter futures belong to the event loop; never touch them from a thread.
+            self._loop.call_soon_threadsafe(self.release)
+            return
+        if not self._released:
+            self._released = True
+            self._pool._release(time.monotonic() - self._started)
+
+    async def wrap(self, stream: AsyncIterator) -> AsyncIterator:
+        """Holds the slot until a streamed response body is finished (or abandoned)."""
+        try:
+            async for item in stream:
+                yield item
+        finally:
+            self.release()
+
+
+class AdmittedStreamingResponse(StreamingResponse):
+    """
+    A streaming response that holds `slot` until it is fully sent. The slot is released
+    even if the client disconnects before the body starts, which skips background tasks.
+    """
+
+    def __init__(self, content, slot: AdmissionSlot, **kwargs):
+        super().__init__(slot.wrap(content), **kwargs)
+        self.slot = slot
+
+    async def __call__(self, scope, receive, send):
+        try:
+            await super().__call__(scope, receive, send)
+        finally:
+            self.slot.release()
+
+
+class AdmissionPool:
+    """
+    Bounds concurrent work of one kind (chat, audio, ingestion).
+
+    Requests are admitted while fewer than `max_in_flight` are running; otherwise they wait in a
+    FIFO queue of at most `max_queue` entries for up to `max_wait` seconds. A request is rejected
+    up front with 429 + Retry-After when its user is over their token-bucket rate, the queue is
+    full, or the expected wait (queue position x average service time) exceeds its deadline.
+    """
+
+    def __init__(self, name: str, max_in_flight: int, max_queue: int, max_wait: float, user_rate: float, user_burst: float):
+        self.name = name
+        self.max_in_flight = max_in_flight
+        self.max_queue = max_queue
+        self.max_wait = max_wait
+        self.user_rate = user_rate
+        self.user_burst = user_burst
+        self.in_flight = 0
+        self._waiters: deque = deque()
+        self._buckets: Dict[Hashable, TokenBucket] = {}
+        self._avg_service_time: Optional[float] = None
+        metrics.ADMISSION_IN_FLIGHT.labels(pool=name).set_function(lambda: self.in_flight)
+        metrics.ADMISSION_QUEUE_DEPTH.labels(pool=name).set_function(lambda: len(self._waiters))
+
+    # --- Public API ---
+    async def acquire(self, user_key: Hashable) -> AdmissionSlot:
+        """Waits for a slot, or raises HTTPException(429) with a Retry-After header."""
+        bucket = self._bucket(user_key)
+        retry_after = bucket.retry_after()
+        if retry_after > 0:
+            self._reject("rate_limited", retry_after)
+
+        if self.in_flight < self.max_in_flight and not self._waiters:
+            bucket.consume()
+            self.in_flight += 1
+            metrics.ADMISSION_WAIT_SECONDS.labels(pool=self.name).observe(0.0)
+            return AdmissionSlot(self)
+
+        if len(self._waiters) >= self.max_queue:
+            self._reject("queue_full", self._expected_wait(len(self._waiters)))
+        expected_wait = self._expected_wait(len(self._waiters) + 1)
+        if expected_wait > self.max_wait:
+            self._reject("deadline", expected_wait)
+
+        bucket.consume()
+        granted = asyncio.get_running_loop().create_future()
+        self._waiters.append(granted)
+        start = time.monotonic()
+        try:
+            await asyncio.wait({granted}, timeout=self.max_wait)
+        except asyncio.CancelledError:
+            # The client went away while queued; hand back a slot granted in the meantime.
+            self._abandon(granted)
+            raise
+        metrics.ADMISSION_WAIT_SECONDS.labels(pool=self.name).observe(time.monotonic() - start)
+        if not granted.done():
+            self._abandon(granted)
+            self._reject("timeout", self._expected_wait(len(self._waiters)))
+        return AdmissionSlot(self)
+
+    @asynccontextmanager
+    async def admit(self, user_key: Hashable):
+        slot = await self.acquire(user_key)
+        try:
+            yield slot
+        finally:
+            slot.release()
+
+    # --- Internals ---
+    def _bucket(self, user_key: Hashable) -> TokenBucket:
+        bucket = self._buckets.get(user_key)
+        if bucket is None:
+            if len(self._buckets) >= MAX_TRACKED_USERS:
+                self._buckets = {k: b for k, b in self._buckets.items() if not b.is_full()}
+            bucket = self._buckets[user_key] = TokenBucket(self.user_rate, self.user_burst)
+        return bucket
+
+    def _expected_wait(self, position: int) -> float:
+        if self._avg_service_time is None:
+            return 0.0
+        return position * self._avg_service_time / self.max_in_flight
+
+    def _reject(self, reason: str, retry_after: float):
+        metrics.ADMISSION_REJECTIONS.labels(pool=self.name, reason=reason).inc()
+        raise HTTPException(
+            status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+            detail=f"Server busy ({self.name}: {reason.replace('_', ' ')}). Please retry later.",
+            headers={"Retry-After": str(max(1, math.ceil(retry_after)))},
+        )
+
+    def _abandon(self, granted: asyncio.Future):
+        if granted.done() and not granted.cancelled():
+            # Granted right as we gave up: pass the slot on.
+            self._release(None)
+            return
+        granted.cancel()
+        try:
+            self._waiters.remove(granted)
+        except ValueError:
+            pass
+
+    def _release(self, service_time: Optional[float]):
+        if service_time is not None:
+            # Exponentially weighted average keeps the deadline estimate current.
+            self._avg_service_time = service_time if self._avg_service_time is None else 0.8 * self._avg_service_time + 0.2 * service_time
+        while self._waiters:
+            waiter = self._waiters.popleft()
+            if not waiter.done():
+                # Hand the slot straight to the next waiter; in_flight is unchanged.
+                waiter.set_result(True)
+                return
+        self.in_flight -= 1
+
+
+def _pool_from_env(name: str, max_in_flight: int, max_queue: int, max_wait: float, user_rate: float, user_burst: float) -> AdmissionPool:
+    prefix = f"ADMISSION_{name.upper()}_"
+    return AdmissionPool(
+        name=name,
+        max_in_flight=int(os.environ.get(prefix + "MAX_IN_FLIGHT", max_in_flight)),
+        max_queue=int(os.environ.get(prefix + "MAX_QUEUE", max_queue)),
+        max_wait=float(os.environ.get(prefix + "MAX_WAIT_SECONDS", max_wait)),
+        user_rate=float(os.environ.get(prefix + "USER_RATE", user_rate)),
+        user_burst=float(os.environ.get(prefix + "USER_BURST", user_burst)),
+    )
+
+
+# --- Pools ---
+# Rates are requests per second per user; bursts are the bucket size.
+chat = _pool_from_env("chat", max_in_flight=16, max_queue=64, max_wait=10.0, user_rate=0.5, user_burst=5)
+audio = _pool_from_env("audio", max_in_flight=8, max_queue=32, max_wait=10.0, user_rate=0.5, user_burst=5)
+ingestion = _pool_from_env("ingestion", max_in_flight=2, max_queue=8, max_wait=30.0, user_rate=0.1, user_burst=3)
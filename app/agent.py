@@ -1,12 +1,17 @@
 import json
+import time
+import asyncio
+from contextlib import aclosing
 from typing import List, Annotated, Dict
 from typing_extensions import TypedDict
 
 from langchain_openai import ChatOpenAI
+from langchain_core.documents import Document
 from langchain_core.messages import AnyMessage, SystemMessage, HumanMessage, AIMessage
 from langgraph.graph import StateGraph, END
 from dotenv import load_dotenv
-from . import rag_service
+from . import rag_service, reranker, metrics, coalescing, query_expansion
+from .context_packing import pack_context, count_tokens
 
 load_dotenv()
 
@@ -20,65 +25,187 @@ Do not use any of your outside general knowledge to answer questions."""
 # --- (Agent State, LLM, Nodes, and Graph Creation are mostly the same) ---
 class AgentState(TypedDict):
     messages: Annotated[List[AnyMessage], lambda x, y: x + y]
+    # Candidate chunks handed from the retrieve step to the rerank step
+    documents: List[Document]
 
 def get_llm(llm_model_name: str = "gpt-4o"):
-    return ChatOpenAI(model=llm_model_name, streaming=True)
+    # stream_usage makes the final streamed chunk carry token counts for the LLM metrics.
+    return ChatOpenAI(model=llm_model_name, streaming=True, stream_usage=True, callbacks=[metrics.llm_callback])
 
+@metrics.timed_node("generate")
 def generate_node(state: AgentState, config):
     llm = get_llm(config["configurable"].get("llm_model_name"))
     return {"messages": [llm.invoke(state["messages"])]}
 
-def retrieve_node(state: AgentState):
+def build_context_message(state: AgentState, docs: List[Document], config) -> SystemMessage:
+    last_message = state["messages"][-1].content
+    llm_model_name = config["configurable"].get("llm_model_name")
+    # Merge overlapping neighbours and keep the context within the token budget
+    packed = pack_context(last_message, docs, llm_model_name, embeddings=rag_service.embeddings_model)
+    # Prepend the instruction to the context for the LLM
+    context_message = SystemMessage(content=f"Context from documents:\n\n{packed.text}")
+    prompt_tokens = sum(count_tokens(m.content, llm_model_name) for m in state["messages"] + [context_message])
+    metrics.CONTEXT_TOKENS.observe(prompt_tokens)
+    metrics.log("context", f"{packed.chunks_in} chunks -> {packed.blocks_used}/{packed.blocks_in} blocks, "
+                           f"context={packed.tokens} tokens, prompt={prompt_tokens} tokens")
+    return context_message
+
+@metrics.timed_node("retrieve")
+def retrieve_node(state: AgentState, config):
     last_message = state["messages"][-1].content
     retriever = rag_service.get_retriever()
     retrieved_docs = retriever.invoke(last_message)
-    context = "\n\n".join([doc.page_content for doc in retrieved_docs])
-    # Prepend the instruction to the context for the LLM
-    context_message = SystemMessage(content=f"Context from documents:\n\n{context}")
-    return {"messages": [context_message]}
+    return {"messages": [build_context_message(state, retrieved_docs, config)]}
+
+@metrics.timed_node("retrieve")
+def retrieve_candidates_node(state: AgentState):
+    """Retrieves a wide candidate set for the rerank node; the context is built after reranking."""
+    last_message = state["messages"][-1].content
+    retriever = rag_service.get_retriever(k=reranker.RERANK_CANDIDATES)
+    return {"documents": retriever.invoke(last_message)}
+
+@metrics.timed_node("rerank")
+def rerank_node(state: AgentState, config):
+    last_message = state["messages"][-1].content
+    candidates = state.get("documents") or []
+    top_docs, elapsed = reranker.rerank(last_message, candidates, reranker.RERANK_TOP_K)
+    metrics.log("rerank", f"scored {len(candidates)} candidates in {elapsed * 1000:.1f} ms, kept {len(top_docs)}")
+    return {"messages": [build_context_message(state, top_docs, config)]}
+
+async def _search_by_vectors(vectors: List[List[float]], k: int) -> List[List[Document]]:
+    # One Qdrant search per vector, issued concurrently
+    return await asyncio.gather(*(
+        asyncio.to_thread(rag_service.search_by_vector, vector, k) for vector in vectors
+    ))
+
+@metrics.timed_node("retrieve")
+async def multi_query_retrieve_node(state: AgentState, config):
+    """
+    Searches with the question and several rewrites of it, fused with reciprocal-rank fusion.
+    The original question is embedded and searched while the rewrites are still being
+    generated, so the expansion latency overlaps with the first search.
+    """
+    question = state["messages"][-1].content
+    start = time.perf_counter()
+
+    async def expand():
+        expansions = await query_expansion.expand_query(question)
+        expanded_at = time.perf_counter()
+        # All rewrites are embedded in one batch
+        vectors = await asyncio.to_thread(rag_service.embeddings_model.embed_documents, expansions) if expansions else []
+        embedded_at = time.perf_counter()
+        results = await _search_by_vectors(vectors, query_expansion.MULTI_QUERY_K)
+        return expansions, results, (expanded_at - start, embedded_at - expanded_at, time.perf_counter() - embedded_at)
+
+    async def search_original():
+        vector = await asyncio.to_thread(rag_service.embeddings_model.embed_query, question)
+        results = await _search_by_vectors([vector], query_expansion.MULTI_QUERY_K)
+        return results[0], time.perf_counter() - start
 
-def create_rag_chatbot_graph():
+    (expansions, expanded_results, (t_expand, t_embed, t_search)), (original_results, t_original) = await asyncio.gather(
+        expand(), search_original()
+    )
+    fuse_start = time.perf_counter()
+    fused = query_expansion.reciprocal_rank_fusion([original_results] + expanded_results, limit=query_expansion.MULTI_QUERY_TOP_K)
+    t_fuse = time.perf_counter() - fuse_start
+
+    for stage, seconds in (("original", t_original), ("expand", t_expand), ("embed", t_embed), ("search", t_search), ("fuse", t_fuse)):
+        metrics.RETRIEVAL_STAGE_SECONDS.labels(stage=stage).observe(seconds)
+    metrics.log("multi-query", f"{len(expansions) + 1} queries -> {len(fused)} chunks in {(time.perf_counter() - start) * 1000:.0f} ms "
+                               f"(original {t_original * 1000:.0f}, expand {t_expand * 1000:.0f}, embed {t_embed * 1000:.0f}, "
+                               f"search {t_search * 1000:.0f}, fuse {t_fuse * 1000:.1f})")
+    return {"messages": [build_context_message(state, fused, config)]}
+
+def create_rag_chatbot_graph(rerank: bool = False, multi_query: bool = False):
     graph_builder = StateGraph(AgentState)
-    graph_builder.add_node("retrieve", retrieve_node)
     graph_builder.add_node("generate", generate_node)
+    if multi_query:
+        # expand + parallel search + RRF -> generate
+        graph_builder.add_node("retrieve", multi_query_retrieve_node)
+        graph_builder.add_edge("retrieve", "generate")
+    elif rerank:
+        # retrieve (top-N) -> rerank (cross-encoder, top-k) -> generate
+        graph_builder.add_node("retrieve", retrieve_candidates_node)
+        graph_builder.add_node("rerank", rerank_node)
+        graph_builder.add_edge("retrieve", "rerank")
+        graph_builder.add_edge("rerank", "generate")
+    else:
+        graph_builder.add_node("retrieve", retrieve_node)
+        graph_builder.add_edge("retrieve", "generate")
     graph_builder.set_entry_point("retrieve")
-    graph_builder.add_edge("retrieve", "generate")
     graph_builder.add_edge("generate", END)
     return graph_builder.compile()
 
-# We only need the RAG agent now.
+DEFAULT_AGENT = "chatbot_rag_lite"
+
 available_agents: Dict[str, any] = {
-    "chatbot_rag_lite": create_rag_chatbot_graph(),
+    DEFAULT_AGENT: create_rag_chatbot_graph(),
+    "chatbot_rag_rerank": create_rag_chatbot_graph(rerank=True),
+    "chatbot_rag_multiquery": create_rag_chatbot_graph(multi_query=True),
 }
+
+def get_agent(agent_name: str = DEFAULT_AGENT):
+    # Unknown names (e.g. the schema's legacy "chatbot_fast" default) fall back to the default agent.
+    return available_agents.get(agent_name, available_agents[DEFAULT_AGENT])
 # --- (End of major changes) ---
 
 
 # --- Agent Execution Functions (Simplified) ---
-# The 'character' and 'agent_name' arguments are no longer needed as they are now fixed.
+# The 'character' argument is no longer needed; 'agent_name' selects one of available_agents.
+
+# Each run starts from just the system prompt and the question, so identical concurrent
+# questions (same model, agent and document set) can share one graph run.
+def _coalescing_key(message: str, llm_model_name: str, agent_name: str) -> str:
+    agent_name = agent_name if agent_name in available_agents else DEFAULT_AGENT
+    return coalescing.request_key(message, llm_model_name, agent_name, rag_service.get_document_generation())
 
-async def run_agent_text_stream(message: str, history: List[dict], llm_model_name: str):
-    agent = available_agents["chatbot_rag_lite"]
+async def _stream_agent_tokens(message: str, llm_model_name: str, agent_name: str):
+    agent = get_agent(agent_name)
     messages_for_agent = [SystemMessage(content=SYSTEM_PROMPT), HumanMessage(content=message)]
     inputs = {"messages": messages_for_agent}
     config = {"configurable": {"llm_model_name": llm_model_name}}
-    
-    full_response = ""
+
     async for event in agent.astream_events(inputs, config=config, version="v1"):
-        if event["event"] == "on_chat_model_stream":
+        # Only the answering model is streamed, never the query-expansion model
+        if event["event"] == "on_chat_model_stream" and query_expansion.EXPANSION_TAG not in event.get("tags", []):
             chunk = event["data"]["chunk"]
             if chunk.content:
-                full_response += chunk.content
-                yield f"data: {json.dumps({'type': 'token', 'delta': chunk.content})}\n\n"
+                yield chunk.content
+
+async def run_agent_text_stream(message: str, history: List[dict], llm_model_name: str, agent_name: str = DEFAULT_AGENT):
+    trace_id = metrics.current_trace_id()
+    if trace_id:
+        yield f"data: {json.dumps({'type': 'trace', 'trace_id': trace_id})}\n\n"
+    if coalescing.COALESCING_ENABLED:
+        key = _coalescing_key(message, llm_model_name, agent_name)
+        tokens = coalescing.stream_runs.subscribe(key, lambda: _stream_agent_tokens(message, llm_model_name, agent_name))
+    else:
+        tokens = _stream_agent_tokens(message, llm_model_name, agent_name)
+
+    full_response = ""
+    async with aclosing(tokens):
+        async for delta in tokens:
+            full_response += delta
+            yield f"data: {json.dumps({'type': 'token', 'delta': delta})}\n\n"
     history.append({"role": "assistant", "content": full_response})
-    yield f"data: {json.dumps({'type': 'done'})}\n\n"
+    done_event = {'type': 'done', 'trace_id': trace_id} if trace_id else {'type': 'done'}
+    yield f"data: {json.dumps(done_event)}\n\n"
 
-async def run_agent_sync(message: str, history: List[dict], llm_model_name: str) -> str:
-    agent = available_agents["chatbot_rag_lite"]
+async def _invoke_agent(message: str, llm_model_name: str, agent_name: str) -> str:
+    agent = get_agent(agent_name)
     messages_for_agent = [SystemMessage(content=SYSTEM_PROMPT), HumanMessage(content=message)]
     inputs = {"messages": messages_for_agent}
     config = {"configurable": {"llm_model_name": llm_model_name}}
-    
+
     result = await agent.ainvoke(inputs, config=config)
-    final_response = result['messages'][-1].content
+    return result['messages'][-1].content
+
+async def run_agent_sync(message: str, history: List[dict], llm_model_name: str, agent_name: str = DEFAULT_AGENT) -> str:
+    if coalescing.COALESCING_ENABLED:
+        key = _coalescing_key(message, llm_model_name, agent_name)
+        final_response = await coalescing.sync_runs.do(key, lambda: _invoke_agent(message, llm_model_name, agent_name))
+    else:
+        final_response = await _invoke_agent(message, llm_model_name, agent_name)
+    # Every caller records the answer in its own thread
     history.append({"role": "assistant", "content": final_response})
     return final_response
\ No newline at end of file
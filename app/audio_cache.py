@@ -0,0 +1,230 @@
+import os
+import hashlib
+import tempfile
+import threading
+from collections import OrderedDict
+from typing import BinaryIO, Dict, Optional, Tuple
+
+# --- Configuration ---
+AUDIO_CACHE_DIR = os.environ.get("AUDIO_CACHE_DIR", "audio_cache")
+AUDIO_CACHE_MAX_DISK_BYTES = int(os.environ.get("AUDIO_CACHE_MAX_DISK_BYTES", 512 * 1024 * 1024))
+AUDIO_CACHE_MAX_MEMORY_BYTES = int(os.environ.get("AUDIO_CACHE_MAX_MEMORY_BYTES", 32 * 1024 * 1024))
+# Only clips up to this size are kept in memory; bigger ones are served from disk.
+AUDIO_CACHE_MAX_MEMORY_ITEM_BYTES = int(os.environ.get("AUDIO_CACHE_MAX_MEMORY_ITEM_BYTES", 256 * 1024))
+
+
+def normalize_text(text: str) -> str:
+    """Collapses whitespace so that trivially different inputs share one clip."""
+    return " ".join(text.split())
+
+
+def make_key(text: str, voice: str, model: str, audio_format: str) -> str:
+    """Content address of a clip: a hash of everything that changes the audio."""
+    digest = hashlib.sha256()
+    for part in (normalize_text(text), voice, model, audio_format):
+        digest.update(part.encode("utf-8"))
+        digest.update(b"\0")
+    return digest.hexdigest()
+
+
+class AudioCacheWriter:
+    """
+    Collects the bytes of a clip while it is being streamed to a client.
+    The clip only becomes visible in the cache once `commit()` is called,
+    so an interrupted stream never leaves a truncated file behind.
+    """
+
+    def __init__(self, cache: "AudioCache", key: str):
+        self._cache = cache
+        self._key = key
+        self._size = 0
+        fd, self._tmp_path = tempfile.mkstemp(dir=cache.directory, suffix=".part")
+        self._file = os.fdopen(fd, "wb")
+
+    def write(self, chunk: bytes):
+        self._file.write(chunk)
+        self._size += len(chunk)
+
+    def commit(self):
+        self._file.close()
+        self._cache._adopt_file(self._key, self._tmp_path, self._size)
+
+    def abort(self):
+        self._file.close()
+        if os.path.exists(self._tmp_path):
+            os.remove(self._tmp_path)
+
+
+class AudioCache:
+    """
+    Two-tier, content-addressed cache for synthesized speech.
+
+    Small clips live in an in-memory LRU; every clip is also written to a
+    size-capped on-disk LRU so it can be served straight from a file.
+    """
+
+    def __init__(self, directory: str, max_disk_bytes: int, max_memory_bytes: int, max_memory_item_bytes: int):
+        self.directory = directory
+        self.max_disk_bytes = max_disk_bytes
+        self.max_memory_bytes = max_memory_bytes
+        self.max_memory_item_bytes = max_memory_item_bytes
+        self._lock = threading.Lock()
+        self._memory: "OrderedDict[str, bytes]" = OrderedDict()
+        self._memory_bytes = 0
+        self._disk: "OrderedDict[str, int]" = OrderedDict()
+        self._disk_bytes = 0
+        # Clips currently being served by path; eviction skips them until they are unpinned.
+        self._pinned: Dict[str, int] = {}
+        self.memory_hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.bytes_saved = 0
+        os.makedirs(directory, exist_ok=True)
+        self._load_disk_index()
+
+    # --- Lookups ---
+    def lookup(self, key: str, pin: bool = False) -> Tuple[Optional[bytes], Optional[str]]:
+        """
+        Returns `(data, None)` for a memory hit, `(None, path)` for a disk hit
+        and `(None, None)` for a miss. Every call counts exactly one hit or miss.
+        With `pin=True` a disk hit cannot be evicted until `unpin(key)` is called.
+        """
+        return self._lookup(key, open_file=False, pin=pin)
+
+    def unpin(self, key: str):
+        with self._lock:
+            count = self._pinned.pop(key, 0) - 1
+            if count > 0:
+                self._pinned[key] = count
+            self._evict_disk()
+
+    def open(self, key: str) -> Tuple[Optional[bytes], Optional[BinaryIO]]:
+        """Like `lookup`, but a disk hit returns an open file, so eviction can no longer remove it."""
+        return self._lookup(key, open_file=True)
+
+    def get(self, key: str) -> Optional[bytes]:
+        """Returns the clip bytes on a hit (promoting small disk clips to memory)."""
+        data, f = self.open(key)
+        if f is not None:
+            with f:
+                data = f.read()
+            self._remember(key, data)
+        return data
+
+    def _lookup(self, key: str, open_file: bool, pin: bool = False):
+        with self._lock:
+            data = self._memory.get(key)
+            if data is not None:
+                self._memory.move_to_end(key)
+                self.memory_hits += 1
+                self.bytes_saved += len(data)
+                return data, None
+            size = self._disk.get(key)
+            if size is not None:
+                path = self._path(key)
+                try:
+                    # Touching the file doubles as the existence check.
+                    os.utime(path)
+                    result = open(path, "rb") if open_file else path
+                except OSError:
+                    # Removed behind our back: forget it and count a miss, not a hit.
+                    del self._disk[key]
+                    self._disk_bytes -= size
+                else:
+                    self._disk.move_to_end(key)
+                    if pin:
+                        self._pinned[key] = self._pinned.get(key, 0) + 1
+                    self.disk_hits += 1
+                    self.bytes_saved += size
+                    return None, result
+            self.misses += 1
+            return None, None
+
+    # --- Inserts ---
+    def put(self, key: str, data: bytes):
+        writer = self.writer(key)
+        writer.write(data)
+        writer.commit()
+        self._remember(key, data)
+
+    def writer(self, key: str) -> AudioCacheWriter:
+        return AudioCacheWriter(self, key)
+
+    def stats(self) -> dict:
+        with self._lock:
+            hits = self.memory_hits + self.disk_hits
+            lookups = hits + self.misses
+            return {
+                "memory_hits": self.memory_hits,
+                "disk_hits": self.disk_hits,
+                "misses": self.misses,
+                "hit_rate": hits / lookups if lookups else 0.0,
+                "bytes_saved": self.bytes_saved,
+                "memory_entries": len(self._memory),
+                "memory_bytes": self._memory_bytes,
+                "disk_entries": len(self._disk),
+                "disk_bytes": self._disk_bytes,
+            }
+
+    # --- Internals ---
+    def _path(self, key: str) -> str:
+        return os.path.join(self.directory, f"{key}.audio")
+
+    def _load_disk_index(self):
+        """Rebuilds the disk LRU from the files left by a previous run, oldest first."""
+        entries = []
+        for name in os.listdir(self.directory):
+            path = os.path.join(self.directory, name)
+            if name.endswith(".part"):
+                os.remove(path)
+                continue
+            if not name.endswith(".audio"):
+                continue
+            stat = os.stat(path)
+            entries.append((stat.st_mtime, name[: -len(".audio")], stat.st_size))
+        for _, key, size in sorted(entries):
+            self._disk[key] = size
+            self._disk_bytes += size
+        with self._lock:
+            self._evict_disk()
+
+    def _adopt_file(self, key: str, tmp_path: str, size: int):
+        os.replace(tmp_path, self._path(key))
+        with self._lock:
+            self._disk_bytes += size - self._disk.pop(key, 0)
+            self._disk[key] = size
+            self._evict_disk()
+
+    def _remember(self, key: str, data: bytes):
+        if len(data) > self.max_memory_item_bytes:
+            return
+        with self._lock:
+            previous = self._memory.pop(key, None)
+            if previous is not None:
+                self._memory_bytes -= len(previous)
+            self._memory[key] = data
+            self._memory_bytes += len(data)
+            while self._memory_bytes > self.max_memory_bytes and self._memory:
+                _, evicted = self._memory.popitem(last=False)
+                self._memory_bytes -= len(evicted)
+
+    def _evict_disk(self):
+        # Caller holds the lock. The most recently used clip and pinned clips are always kept.
+        for key in list(self._disk)[:-1]:
+            if self._disk_bytes <= self.max_disk_bytes:
+                break
+            if key in self._pinned:
+                continue
+            self._disk_bytes -= self._disk.pop(key)
+            try:
+                os.remove(self._path(key))
+            except OSError:
+                pass
+
+
+cache = AudioCache(
+    directory=AUDIO_CACHE_DIR,
+    max_disk_bytes=AUDIO_CACHE_MAX_DISK_BYTES,
+    max_memory_bytes=AUDIO_CACHE_MAX_MEMORY_BYTES,
+    max_memory_item_bytes=AUDIO_CACHE_MAX_MEMORY_ITEM_BYTES,
+)
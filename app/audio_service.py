@@ -1,6 +1,12 @@
 import os
+import time
+from typing import Optional
 from openai import AsyncOpenAI
 from dotenv import load_dotenv
+from fastapi import Response
+from fastapi.responses import FileResponse
+from . import metrics
+from .audio_cache import cache as audio_cache, make_key
 
 # Load environment variables from your .env file
 load_dotenv()
@@ -9,29 +15,84 @@ load_dotenv()
 # It automatically finds and uses the OPENAI_API_KEY from your environment.
 client = AsyncOpenAI()
 
-async def text_to_audio_sync(text: str) -> bytes:
+TTS_MODEL = "tts-1"
+TTS_VOICE = "alloy"  # You can experiment with other voices: echo, fable, onyx, nova, shimmer
+TTS_FORMAT = "mp3"
+STREAM_CHUNK_SIZE = 64 * 1024
+
+metrics.gauge_callback("knobot_audio_cache_hit_rate", "Share of TTS requests served from the audio cache.",
+                       lambda: audio_cache.stats()["hit_rate"])
+metrics.gauge_callback("knobot_audio_cache_bytes_saved", "Audio bytes served from the cache instead of the TTS API.",
+                       lambda: audio_cache.stats()["bytes_saved"])
+
+def audio_cache_key(text: str) -> str:
+    return make_key(text, TTS_VOICE, TTS_MODEL, TTS_FORMAT)
+
+class CachedAudioFileResponse(FileResponse):
+    """Serves a cached clip from disk, keeping it pinned in the cache until it has been sent."""
+
+    def __init__(self, path: str, key: str, **kwargs):
+        super().__init__(path, **kwargs)
+        self.key = key
+
+    async def __call__(self, scope, receive, send):
+        try:
+            await super().__call__(scope, receive, send)
+        finally:
+            audio_cache.unpin(self.key)
+
+def cached_audio_response(text: str) -> Optional[Response]:
+    """
+    Checks the audio cache for an already synthesized clip of `text`.
+
+    Returns:
+        Response: the clip from memory, or a file response for a clip stored
+        on disk, or None if the text has not been synthesized yet.
+    """
+    key = audio_cache_key(text)
+    data, path = audio_cache.lookup(key, pin=True)
+    if data is not None:
+        return Response(content=data, media_type="audio/mpeg")
+    if path is not None:
+        return CachedAudioFileResponse(path, key, media_type="audio/mpeg")
+    return None
+
+async def text_to_audio_sync(text: str, check_cache: bool = True) -> bytes:
     """
     Converts a text string to an MP3 audio file (as bytes) synchronously.
-    This is used for the downloadable audio file.
+    This is used for the downloadable audio file. Identical text is served
+    from the audio cache instead of calling the TTS API again.
     
     Args:
         text (str): The text to convert into speech.
+        check_cache (bool): False when the caller has already missed the cache,
+            so the request is not counted as a second miss.
 
     Returns:
         bytes: The complete MP3 audio data.
     """
-    response = await client.audio.speech.create(
-        model="tts-1",
-        voice="alloy",  # You can experiment with other voices: echo, fable, onyx, nova, shimmer
-        input=text,
-    )
-    # The response object has a `read()` method that returns the audio bytes.
-    return response.read()
+    key = audio_cache_key(text)
+    if check_cache:
+        cached = audio_cache.get(key)
+        if cached is not None:
+            return cached
+    with metrics.timer(metrics.TTS_SECONDS, mode="sync"):
+        response = await client.audio.speech.create(
+            model=TTS_MODEL,
+            voice=TTS_VOICE,
+            input=text,
+            response_format=TTS_FORMAT,
+        )
+        # The response object has a `read()` method that returns the audio bytes.
+        audio_bytes = response.read()
+    audio_cache.put(key, audio_bytes)
+    return audio_bytes
 
 async def text_to_audio_stream(text: str):
     """
     Converts a text string to a streaming MP3 audio file.
-    This is used for the audio streaming endpoint.
+    This is used for the audio streaming endpoint. Cached clips are replayed
+    from the cache; otherwise the stream is written into the cache as it is sent.
 
     Args:
         text (str): The text to convert into speech.
@@ -39,11 +100,39 @@ async def text_to_audio_stream(text: str):
     Yields:
         bytes: Chunks of the MP3 audio data as they become available.
     """
-    async with client.audio.speech.with_streaming_response.create(
-        model="tts-1",
-        voice="alloy",
-        input=text,
-    ) as response:
-        # Stream the audio data in chunks
-        async for chunk in response.iter_bytes():
-            yield chunk
\ No newline at end of file
+    key = audio_cache_key(text)
+    data, f = audio_cache.open(key)
+    if data is not None:
+        yield data
+        return
+    if f is not None:
+        with f:
+            while chunk := f.read(STREAM_CHUNK_SIZE):
+                yield chunk
+        return
+
+    writer = audio_cache.writer(key)
+    completed = False
+    start = time.perf_counter()
+    first_chunk = True
+    try:
+        async with client.audio.speech.with_streaming_response.create(
+            model=TTS_MODEL,
+            voice=TTS_VOICE,
+            input=text,
+            response_format=TTS_FORMAT,
+        ) as response:
+            # Stream the audio data in chunks, teeing each one into the cache
+            async for chunk in response.iter_bytes():
+                if first_chunk:
+                    # For streaming, the latency that matters is time to the first audio bytes.
+                    metrics.TTS_SECONDS.labels(mode="stream_first_byte").observe(time.perf_counter() - start)
+                    first_chunk = False
+                writer.write(chunk)
+                yield chunk
+        completed = True
+    finally:
+        if completed:
+            writer.commit()
+        else:
+            writer.abort()
@@ -0,0 +1,131 @@
+import os
+import re
+from typing import List, Tuple
+
+from langchain_core.documents import Document
+from langchain_text_splitters import RecursiveCharacterTextSplitter
+
+from .embeddings import EMBEDDING_MAX_TOKENS, load_tokenizer
+
+# --- Configuration ---
+# "tokens" fits chunks to the embedding model window; "characters" is the original 1000-char splitter.
+CHUNKING_STRATEGY = os.environ.get("CHUNKING_STRATEGY", "tokens")
+# Leave room for the [CLS] and [SEP] tokens the model adds.
+CHUNK_MAX_TOKENS = int(os.environ.get("CHUNK_MAX_TOKENS", EMBEDDING_MAX_TOKENS - 2))
+CHUNK_OVERLAP_TOKENS = int(os.environ.get("CHUNK_OVERLAP_TOKENS", 32))
+
+# A sentence ends at . ! ? (optionally followed by a closing quote/bracket) before whitespace,
+# or at a blank line, which PDF extraction leaves between headings and paragraphs.
+SENTENCE_PATTERN = re.compile(r"\S.*?(?:[.!?][\"')\]]?(?=\s)|(?=\n\s*\n)|$)", re.S)
+
+
+class TokenSentenceSplitter:
+    """
+    Splits text into chunks of at most `max_tokens` embedding-model tokens, cutting only at
+    sentence boundaries (a single over-long sentence is cut at token boundaries instead).
+    Consecutive chunks share up to `overlap_tokens` tokens: whole trailing sentences when
+    they fit, otherwise the tail of the last sentence, cut at a word start.
+
+    All sentences of all documents are tokenized in one batch call of the fast tokenizer.
+    """
+
+    def __init__(self, tokenizer, max_tokens: int = CHUNK_MAX_TOKENS, overlap_tokens: int = CHUNK_OVERLAP_TOKENS):
+        self.tokenizer = tokenizer
+        self.max_tokens = max_tokens
+        self.overlap_tokens = overlap_tokens
+
+    @staticmethod
+    def _sentence_spans(text: str) -> List[Tuple[int, int]]:
+        return [m.span() for m in SENTENCE_PATTERN.finditer(text)]
+
+    def split_text(self, text: str) -> List[str]:
+        return self._split_many([text])[0]
+
+    def split_documents(self, documents: List[Document]) -> List[Document]:
+        chunks = []
+        for doc, texts in zip(documents, self._split_many([d.page_content for d in documents])):
+            chunks.extend(Document(page_content=t, metadata=dict(doc.metadata)) for t in texts)
+        return chunks
+
+    def _split_many(self, texts: List[str]) -> List[List[str]]:
+        spans = [self._sentence_spans(text) for text in texts]
+        flat = [text[start:end] for text, text_spans in zip(texts, spans) for start, end in text_spans]
+        encodings = self.tokenizer.encode_batch(flat, add_special_tokens=False) if flat else []
+
+        results, offset = [], 0
+        for text, text_spans in zip(texts, spans):
+            sentence_encodings = encodings[offset : offset + len(text_spans)]
+            offset += len(text_spans)
+            results.append(self._pack(text, text_spans, sentence_encodings))
+        return results
+
+    def _pack(self, text: str, spans: List[Tuple[int, int]], encodings) -> List[str]:
+        counts = [len(e.ids) for e in encodings]
+        chunks = []
+        i = 0
+        # Overlap cut from inside the previous chunk's last sentence: (start char, tokens).
+        carry_start, carry_tokens = None, 0
+        while i < len(spans):
+            j, total = i, carry_tokens
+            while j < len(spans) and total + counts[j] <= self.max_tokens:
+                total += counts[j]
+                j += 1
+            if j == i:
+                if carry_tokens:
+                    # The carried overlap leaves no room for the next sentence; drop it.
+                    carry_start, carry_tokens = None, 0
+                    continue
+                # One sentence longer than the window: cut it at token offsets.
+                chunks.extend(self._split_long_sentence(text, spans[i][0], encodings[i]))
+                i += 1
+                continue
+            chunks.append(text[spans[i][0] if carry_start is None else carry_start : spans[j - 1][1]])
+            if j == len(spans):
+                break
+            # Start the next chunk with whole trailing sentences worth at most overlap_tokens,
+            # always moving forward, and only if the next new sentence still fits beside them.
+            k, overlap = j, 0
+            while (k - 1 > i and overlap + counts[k - 1] <= self.overlap_tokens
+                   and overlap + counts[k - 1] + counts[j] <= self.max_tokens):
+                overlap += counts[k - 1]
+                k -= 1
+            carry_start, carry_tokens = None, 0
+            if k == j:
+                # No whole sentence fits: carry the tail of the last sentence instead.
+                carry_start, carry_tokens = self._sentence_tail(
+                    spans[j - 1][0], encodings[j - 1], min(self.overlap_tokens, self.max_tokens - counts[j]))
+            i = k
+        return chunks
+
+    @staticmethod
+    def _sentence_tail(base: int, encoding, max_tokens: int):
+        """Start offset and size of the last at most `max_tokens` tokens of a sentence, cut at a word start."""
+        if max_tokens <= 0:
+            return None, 0
+        start = max(0, len(encoding.ids) - max_tokens)
+        word_ids = encoding.word_ids
+        while 0 < start < len(word_ids) and word_ids[start] is not None and word_ids[start] == word_ids[start - 1]:
+            start += 1
+        if start >= len(word_ids):
+            return None, 0
+        return base + encoding.offsets[start][0], len(word_ids) - start
+
+    def _split_long_sentence(self, text: str, base: int, encoding) -> List[str]:
+        offsets = encoding.offsets
+        step = max(1, self.max_tokens - self.overlap_tokens)
+        pieces = []
+        for start in range(0, len(offsets), step):
+            window = offsets[start : start + self.max_tokens]
+            pieces.append(text[base + window[0][0] : base + window[-1][1]])
+            if start + self.max_tokens >= len(offsets):
+                break
+        return pieces
+
+
+def create_text_splitter(strategy: str = CHUNKING_STRATEGY):
+    """Returns the splitter used at ingestion; both kinds expose `split_documents`."""
+    if strategy == "tokens":
+        return TokenSentenceSplitter(load_tokenizer())
+    if strategy == "characters":
+        return RecursiveCharacterTextSplitter(chunk_size=1000, chunk_overlap=100)
+    raise ValueError(f"Unknown chunking strategy '{strategy}'. Expected tokens or characters.")
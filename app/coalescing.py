@@ -0,0 +1,119 @@
+import os
+import asyncio
+import hashlib
+from contextlib import aclosing
+from typing import AsyncIterator, Awaitable, Callable, Dict, List, Optional
+
+from . import metrics
+
+# --- Configuration ---
+COALESCING_ENABLED = os.environ.get("COALESCING_ENABLED", "true").lower() == "true"
+
+
+def request_key(message: str, llm_model_name: str, agent_name: str, document_generation: int) -> str:
+    """Identical questions for the same model, agent and document set share one graph run."""
+    normalized = " ".join(message.casefold().split())
+    raw = "\0".join([normalized, llm_model_name or "", agent_name or "", str(document_generation)])
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+class SingleFlight:
+    """Concurrent callers with the same key await one shared coroutine instead of each running it."""
+
+    def __init__(self):
+        self._calls: Dict[str, asyncio.Task] = {}
+
+    async def do(self, key: str, fn: Callable[[], Awaitable]):
+        task = self._calls.get(key)
+        if task is None:
+            metrics.COALESCED_REQUESTS.labels(mode="sync", role="leader").inc()
+            task = asyncio.ensure_future(fn())
+            self._calls[key] = task
+            task.add_done_callback(lambda t: self._forget(key, t))
+        else:
+            metrics.COALESCED_REQUESTS.labels(mode="sync", role="follower").inc()
+        # shield: one caller disconnecting must not cancel the run for the others
+        return await asyncio.shield(task)
+
+    def _forget(self, key: str, task: asyncio.Task):
+        if self._calls.get(key) is task:
+            del self._calls[key]
+
+
+class TokenBroadcast:
+    """
+    Runs one token stream in a background task and fans it out to any number of subscribers.
+    Late subscribers first get everything generated so far, then follow live.
+    The run is cancelled once its last subscriber leaves.
+    """
+
+    def __init__(self, stream: AsyncIterator[str], on_finished: Callable[["TokenBroadcast"], None]):
+        self.deltas: List[str] = []
+        self.done = False
+        self.error: Optional[BaseException] = None
+        self.subscribers = 0
+        self._on_finished = on_finished
+        self._changed = asyncio.Event()
+        self._task = asyncio.ensure_future(self._run(stream))
+
+    async def _run(self, stream: AsyncIterator[str]):
+        try:
+            async for delta in stream:
+                self.deltas.append(delta)
+                self._notify()
+        except Exception as e:
+            self.error = e
+        finally:
+            self.done = True
+            self._on_finished(self)
+            self._notify()
+
+    def _notify(self):
+        changed, self._changed = self._changed, asyncio.Event()
+        changed.set()
+
+    async def subscribe(self) -> AsyncIterator[str]:
+        self.subscribers += 1
+        position = 0
+        try:
+            while True:
+                while position < len(self.deltas):
+                    yield self.deltas[position]
+                    position += 1
+                if self.done:
+                    if self.error is not None:
+                        raise self.error
+                    return
+                await self._changed.wait()
+        finally:
+            self.subscribers -= 1
+            if self.subscribers == 0 and not self.done:
+                self._on_finished(self)
+                self._task.cancel()
+
+
+class StreamCoalescer:
+    def __init__(self):
+        self._streams: Dict[str, TokenBroadcast] = {}
+
+    async def subscribe(self, key: str, stream_factory: Callable[[], AsyncIterator[str]]) -> AsyncIterator[str]:
+        broadcast = self._streams.get(key)
+        if broadcast is None:
+            metrics.COALESCED_REQUESTS.labels(mode="stream", role="leader").inc()
+            broadcast = TokenBroadcast(stream_factory(), lambda b: self._forget(key, b))
+            self._streams[key] = broadcast
+        else:
+            metrics.COALESCED_REQUESTS.labels(mode="stream", role="follower").inc()
+        # aclosing: leaving early must drop the subscription now, not whenever the generator is collected
+        async with aclosing(broadcast.subscribe()) as deltas:
+            async for delta in deltas:
+                yield delta
+
+    def _forget(self, key: str, broadcast: TokenBroadcast):
+        # Finished or abandoned runs stop accepting new subscribers immediately.
+        if self._streams.get(key) is broadcast:
+            del self._streams[key]
+
+
+sync_runs = SingleFlight()
+stream_runs = StreamCoalescer()
@@ -0,0 +1,159 @@
+import os
+from functools import lru_cache
+from typing import List, NamedTuple, Optional
+
+import numpy as np
+import tiktoken
+from langchain_core.documents import Document
+from langchain_core.embeddings import Embeddings
+
+from .chunking import CHUNK_OVERLAP_TOKENS
+
+# --- Configuration ---
+CONTEXT_TOKEN_BUDGET = int(os.environ.get("CONTEXT_TOKEN_BUDGET", 3000))
+CONTEXT_MMR_ENABLED = os.environ.get("CONTEXT_MMR_ENABLED", "false").lower() == "true"
+CONTEXT_MMR_LAMBDA = float(os.environ.get("CONTEXT_MMR_LAMBDA", 0.7))
+# The token splitter overlaps by at most CHUNK_OVERLAP_TOKENS word-piece tokens (allow 10 chars each);
+# 300 still covers the 100-character overlap of the character splitter.
+MAX_OVERLAP_CHARS = max(300, CHUNK_OVERLAP_TOKENS * 10)
+MIN_OVERLAP_CHARS = 20
+# A block that does not fit is only truncated if at least this many tokens are left.
+MIN_PARTIAL_TOKENS = 64
+BLOCK_SEPARATOR = "\n\n"
+
+
+class PackedContext(NamedTuple):
+    text: str
+    tokens: int
+    chunks_in: int
+    blocks_in: int
+    blocks_used: int
+
+
+@lru_cache(maxsize=8)
+def get_encoding(llm_model_name: Optional[str]) -> tiktoken.Encoding:
+    """Returns the tokenizer used by the given OpenAI model (o200k_base for unknown models)."""
+    try:
+        return tiktoken.encoding_for_model(llm_model_name or "gpt-4o")
+    except KeyError:
+        return tiktoken.get_encoding("o200k_base")
+
+
+def count_tokens(text: str, llm_model_name: Optional[str] = None) -> int:
+    return len(get_encoding(llm_model_name).encode(text, disallowed_special=()))
+
+
+def strip_overlap(previous: str, current: str) -> str:
+    """Removes the prefix of `current` that repeats the end of `previous`."""
+    longest = min(len(previous), len(current), MAX_OVERLAP_CHARS)
+    for size in range(longest, MIN_OVERLAP_CHARS - 1, -1):
+        if previous.endswith(current[:size]):
+            return current[size:]
+    return current
+
+
+def merge_adjacent_chunks(docs: List[Document]) -> List[Document]:
+    """
+    Merges retrieved chunks of the same `source` with consecutive `chunk_id`s into one block,
+    dropping duplicate chunks and the text repeated by the splitter's overlap.
+    Blocks are returned in the order of their best-ranked chunk.
+    """
+    seen = set()
+    ranked = []  # (rank, source, chunk_id, doc)
+    for rank, doc in enumerate(docs):
+        source = doc.metadata.get("source")
+        chunk_id = doc.metadata.get("chunk_id")
+        key = (source, chunk_id) if chunk_id is not None else ("content", doc.page_content)
+        if key in seen:
+            continue
+        seen.add(key)
+        ranked.append((rank, source, chunk_id, doc))
+
+    blocks = []  # (rank, Document)
+    current = None
+    for rank, source, chunk_id, doc in sorted(ranked, key=lambda r: (r[2] is None, str(r[1]), r[2] or 0, r[0])):
+        if (current is not None and chunk_id is not None and current["source"] == source
+                and current["last_id"] + 1 == chunk_id):
+            remainder = strip_overlap(current["text"], doc.page_content)
+            if remainder == doc.page_content and not (current["text"][-1:].isspace() or remainder[:1].isspace()):
+                # No shared text: the splitters trim chunk edges, so put the whitespace back.
+                remainder = " " + remainder
+            current["text"] += remainder
+            current["last_id"] = chunk_id
+            current["rank"] = min(current["rank"], rank)
+            continue
+        if current is not None:
+            blocks.append(current)
+        current = {"source": source, "first_id": chunk_id, "last_id": chunk_id, "rank": rank, "text": doc.page_content}
+    if current is not None:
+        blocks.append(current)
+
+    blocks.sort(key=lambda b: b["rank"])
+    return [
+        Document(page_content=b["text"], metadata={"source": b["source"], "chunk_id": b["first_id"], "last_chunk_id": b["last_id"]})
+        for b in blocks
+    ]
+
+
+def mmr_order(query: str, blocks: List[Document], embeddings: Embeddings, lambda_mult: float = CONTEXT_MMR_LAMBDA) -> List[Document]:
+    """Reorders blocks by maximal marginal relevance so near-duplicates fall behind diverse content."""
+    if len(blocks) < 3:
+        return blocks
+    query_vec = np.array(embeddings.embed_query(query))
+    block_vecs = np.array(embeddings.embed_documents([b.page_content for b in blocks]))
+    query_vec = query_vec / (np.linalg.norm(query_vec) or 1.0)
+    block_vecs = block_vecs / np.maximum(np.linalg.norm(block_vecs, axis=1, keepdims=True), 1e-12)
+    relevance = block_vecs @ query_vec
+    similarity = block_vecs @ block_vecs.T
+
+    selected = [int(np.argmax(relevance))]
+    remaining = set(range(len(blocks))) - set(selected)
+    while remaining:
+        candidates = list(remaining)
+        redundancy = similarity[np.ix_(candidates, selected)].max(axis=1)
+        scores = lambda_mult * relevance[candidates] - (1 - lambda_mult) * redundancy
+        best = candidates[int(np.argmax(scores))]
+        selected.append(best)
+        remaining.remove(best)
+    return [blocks[i] for i in selected]
+
+
+def pack_context(
+    query: str,
+    docs: List[Document],
+    llm_model_name: Optional[str] = None,
+    token_budget: int = CONTEXT_TOKEN_BUDGET,
+    use_mmr: bool = CONTEXT_MMR_ENABLED,
+    embeddings: Optional[Embeddings] = None,
+) -> PackedContext:
+    """
+    Builds the document context for the LLM: merges adjacent chunks, optionally diversifies
+    them with MMR, then fills `token_budget` (measured with the model's tokenizer) in rank order.
+    """
+    encoding = get_encoding(llm_model_name)
+    blocks = merge_adjacent_chunks(docs)
+    if use_mmr and embeddings is not None:
+        blocks = mmr_order(query, blocks, embeddings)
+
+    separator_tokens = len(encoding.encode(BLOCK_SEPARATOR))
+    parts, used = [], 0
+    for block in blocks:
+        tokens = encoding.encode(block.page_content, disallowed_special=())
+        cost = len(tokens) + (separator_tokens if parts else 0)
+        if used + cost <= token_budget:
+            parts.append(block.page_content)
+            used += cost
+            continue
+        remaining = token_budget - used - (separator_tokens if parts else 0)
+        if remaining >= MIN_PARTIAL_TOKENS:
+            parts.append(encoding.decode(tokens[:remaining]))
+            used += remaining + (separator_tokens if len(parts) > 1 else 0)
+        break
+
+    return PackedContext(
+        text=BLOCK_SEPARATOR.join(parts),
+        tokens=used,
+        chunks_in=len(docs),
+        blocks_in=len(blocks),
+        blocks_used=len(parts),
+    )
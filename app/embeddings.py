@@ -0,0 +1,177 @@
+import os
+from typing import List, Optional
+
+import numpy as np
+from langchain_core.embeddings import Embeddings
+
+from . import metrics
+
+# --- Configuration ---
+EMBEDDING_MODEL_NAME = os.environ.get("EMBEDDING_MODEL_NAME", "all-MiniLM-L6-v2")
+EMBEDDING_HF_REPO = os.environ.get("EMBEDDING_HF_REPO", f"sentence-transformers/{EMBEDDING_MODEL_NAME}")
+# torch (HuggingFaceEmbeddings), onnx (fp32 ONNX Runtime) or onnx-int8 (dynamically quantized)
+EMBEDDING_BACKEND = os.environ.get("EMBEDDING_BACKEND", "torch")
+EMBEDDING_THREADS = int(os.environ.get("EMBEDDING_THREADS", 4))
+EMBEDDING_BATCH_SIZE = int(os.environ.get("EMBEDDING_BATCH_SIZE", 32))
+# all-MiniLM-L6-v2 is trained with max_seq_length=256
+EMBEDDING_MAX_TOKENS = int(os.environ.get("EMBEDDING_MAX_TOKENS", 256))
+EMBEDDING_CACHE_DIR = os.environ.get("EMBEDDING_CACHE_DIR", "model_cache")
+EMBEDDING_PARITY_CHECK = os.environ.get("EMBEDDING_PARITY_CHECK", "false").lower() == "true"
+EMBEDDING_PARITY_THRESHOLD = float(os.environ.get("EMBEDDING_PARITY_THRESHOLD", 0.99))
+
+PARITY_SAMPLE_TEXTS = [
+    "What is the refund policy for damaged items?",
+    "The warranty covers manufacturing defects for two years from the date of purchase.",
+    "Reset your password from the account settings page.",
+    "Batteries must be recycled according to local regulations and never disposed of with household waste.",
+    "KnoBot answers questions strictly based on the uploaded documents.",
+]
+
+
+def load_tokenizer(hf_repo: str = EMBEDDING_HF_REPO, cache_dir: str = EMBEDDING_CACHE_DIR):
+    """
+    Loads the embedding model's fast (Rust) tokenizer with truncation and padding turned off;
+    the hub tokenizer.json ships its own settings, which callers should not inherit silently.
+    """
+    from huggingface_hub import hf_hub_download
+    from tokenizers import Tokenizer
+
+    tokenizer = Tokenizer.from_file(hf_hub_download(hf_repo, "tokenizer.json", cache_dir=cache_dir))
+    tokenizer.no_truncation()
+    tokenizer.no_padding()
+    return tokenizer
+
+
+class OnnxEmbeddings(Embeddings):
+    """
+    Sentence embeddings computed with ONNX Runtime on CPU.
+
+    Texts are sorted by token length and padded per batch, so a batch of short
+    questions is not padded to the length of the longest chunk in the request.
+    Mean pooling and L2 normalisation match the sentence-transformers pipeline.
+    """
+
+    def __init__(
+        self,
+        hf_repo: str = EMBEDDING_HF_REPO,
+        quantized: bool = False,
+        threads: int = EMBEDDING_THREADS,
+        batch_size: int = EMBEDDING_BATCH_SIZE,
+        max_tokens: int = EMBEDDING_MAX_TOKENS,
+        cache_dir: str = EMBEDDING_CACHE_DIR,
+    ):
+        try:
+            import onnxruntime as ort
+            from huggingface_hub import hf_hub_download
+        except ImportError as e:
+            raise ImportError("The ONNX embedding backend needs `onnxruntime`, `tokenizers` and `huggingface_hub`.") from e
+
+        self.batch_size = batch_size
+        model_path = hf_hub_download(hf_repo, "onnx/model.onnx", cache_dir=cache_dir)
+        if quantized:
+            model_path = self._quantize(model_path, cache_dir)
+
+        self.tokenizer = load_tokenizer(hf_repo, cache_dir)
+        self.tokenizer.enable_truncation(max_length=max_tokens)
+
+        options = ort.SessionOptions()
+        options.intra_op_num_threads = threads
+        options.inter_op_num_threads = 1
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        self.session = ort.InferenceSession(model_path, options, providers=["CPUExecutionProvider"])
+        self.input_names = {i.name for i in self.session.get_inputs()}
+
+    @staticmethod
+    def _quantize(model_path: str, cache_dir: str) -> str:
+        quantized_path = os.path.join(cache_dir, f"{EMBEDDING_MODEL_NAME}-int8.onnx")
+        if not os.path.exists(quantized_path):
+            from onnxruntime.quantization import QuantType, quantize_dynamic
+
+            os.makedirs(cache_dir, exist_ok=True)
+            quantize_dynamic(model_path, quantized_path, weight_type=QuantType.QInt8)
+        return quantized_path
+
+    def _embed_batch(self, encodings) -> np.ndarray:
+        width = max(len(e.ids) for e in encodings)
+        input_ids = np.zeros((len(encodings), width), dtype=np.int64)
+        attention_mask = np.zeros((len(encodings), width), dtype=np.int64)
+        for row, encoding in enumerate(encodings):
+            input_ids[row, : len(encoding.ids)] = encoding.ids
+            attention_mask[row, : len(encoding.ids)] = 1
+        feeds = {"input_ids": input_ids, "attention_mask": attention_mask}
+        if "token_type_ids" in self.input_names:
+            feeds["token_type_ids"] = np.zeros_like(input_ids)
+
+        token_embeddings = self.session.run(None, feeds)[0]
+        mask = attention_mask[..., None].astype(np.float32)
+        pooled = (token_embeddings * mask).sum(axis=1) / np.clip(mask.sum(axis=1), 1e-9, None)
+        return pooled / np.clip(np.linalg.norm(pooled, axis=1, keepdims=True), 1e-12, None)
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        if not texts:
+            return []
+        encodings = self.tokenizer.encode_batch(texts)
+        order = sorted(range(len(texts)), key=lambda i: len(encodings[i].ids))
+        vectors: List[Optional[List[float]]] = [None] * len(texts)
+        for start in range(0, len(order), self.batch_size):
+            batch = order[start : start + self.batch_size]
+            for i, vector in zip(batch, self._embed_batch([encodings[i] for i in batch]).tolist()):
+                vectors[i] = vector
+        return vectors
+
+    def embed_query(self, text: str) -> List[float]:
+        return self.embed_documents([text])[0]
+
+
+class InstrumentedEmbeddings(Embeddings):
+    """Records batch latency and batch size of any embeddings backend."""
+
+    def __init__(self, inner: Embeddings, backend: str):
+        self.inner = inner
+        self.backend = backend
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        metrics.EMBEDDING_BATCH_SIZE.labels(backend=self.backend, kind="documents").observe(len(texts))
+        with metrics.timer(metrics.EMBEDDING_SECONDS, backend=self.backend, kind="documents"):
+            return self.inner.embed_documents(texts)
+
+    def embed_query(self, text: str) -> List[float]:
+        with metrics.timer(metrics.EMBEDDING_SECONDS, backend=self.backend, kind="query"):
+            return self.inner.embed_query(text)
+
+
+def _create_backend(backend: str):
+    if backend == "torch":
+        # Imported lazily so the ONNX backends never load torch.
+        from langchain_huggingface import HuggingFaceEmbeddings
+
+        return HuggingFaceEmbeddings(model_name=EMBEDDING_MODEL_NAME), backend
+    if backend in ("onnx", "onnx-int8"):
+        onnx_embeddings = OnnxEmbeddings(quantized=backend == "onnx-int8")
+        if EMBEDDING_PARITY_CHECK:
+            reference, _ = _create_backend("torch")
+            similarity = check_parity(onnx_embeddings, reference)
+            if similarity < EMBEDDING_PARITY_THRESHOLD:
+                print(f"WARNING: {backend} embeddings diverge from torch (min cosine {similarity:.4f}); using torch.")
+                return reference, "torch"
+            print(f"Embedding parity check passed for {backend} (min cosine {similarity:.4f}).")
+        return onnx_embeddings, backend
+    raise ValueError(f"Unknown embedding backend '{backend}'. Expected torch, onnx or onnx-int8.")
+
+
+def create_embeddings(backend: str = EMBEDDING_BACKEND) -> Embeddings:
+    """Builds the embedding backend named by `backend` (torch, onnx or onnx-int8)."""
+    embeddings, backend = _create_backend(backend)
+    if metrics.METRICS_ENABLED:
+        return InstrumentedEmbeddings(embeddings, backend)
+    return embeddings
+
+
+def check_parity(candidate: Embeddings, reference: Embeddings, texts: Optional[List[str]] = None) -> float:
+    """Returns the lowest cosine similarity between two backends' embeddings of the same texts."""
+    texts = texts or PARITY_SAMPLE_TEXTS
+    a = np.array(candidate.embed_documents(texts))
+    b = np.array(reference.embed_documents(texts))
+    a /= np.linalg.norm(a, axis=1, keepdims=True)
+    b /= np.linalg.norm(b, axis=1, keepdims=True)
+    return float((a * b).sum(axis=1).min())
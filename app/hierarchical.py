@@ -0,0 +1,85 @@
+import os
+import uuid
+from typing import List, Optional, Sequence
+
+import numpy as np
+from qdrant_client import QdrantClient, models
+
+# --- Configuration ---
+# "flat" searches every chunk; "hierarchical" first picks documents, then searches their chunks.
+RETRIEVAL_MODE = os.environ.get("RETRIEVAL_MODE", "flat")
+DOC_INDEX_COLLECTION_NAME = os.environ.get("DOC_INDEX_COLLECTION_NAME", "wattos_ai_document_index")
+# Each document is summarised by up to this many centroids of consecutive chunk ranges.
+DOC_INDEX_SECTIONS = int(os.environ.get("DOC_INDEX_SECTIONS", 4))
+HIERARCHICAL_TOP_DOCUMENTS = int(os.environ.get("HIERARCHICAL_TOP_DOCUMENTS", 5))
+SOURCE_PAYLOAD_KEY = "metadata.source"
+
+
+def document_vectors(chunk_vectors: Sequence[Sequence[float]], sections: int = DOC_INDEX_SECTIONS) -> List[List[float]]:
+    """
+    Summarises a document by the normalised centroids of up to `sections` consecutive
+    ranges of its chunks, so long documents about several topics keep one vector per part.
+    """
+    vectors = np.asarray(chunk_vectors, dtype=np.float32)
+    centroids = []
+    for part in np.array_split(vectors, min(sections, len(vectors))):
+        centroid = part.mean(axis=0)
+        centroids.append((centroid / (np.linalg.norm(centroid) or 1.0)).tolist())
+    return centroids
+
+
+def document_point_id(source: str, section: int) -> str:
+    # Deterministic ids, so re-uploading a document overwrites its summary vectors.
+    return str(uuid.uuid5(uuid.NAMESPACE_URL, f"{source}#{section}"))
+
+
+def index_document(client: QdrantClient, collection_name: str, source: str, chunk_vectors, sections: int = DOC_INDEX_SECTIONS):
+    """Replaces the summary vectors of `source` in the document-level collection."""
+    client.delete(
+        collection_name=collection_name,
+        points_selector=models.FilterSelector(filter=source_filter([source], key="source")),
+        wait=True,
+    )
+    client.upsert(
+        collection_name=collection_name,
+        points=[
+            models.PointStruct(id=document_point_id(source, i), vector=vector,
+                               payload={"source": source, "section": i, "chunks": len(chunk_vectors)})
+            for i, vector in enumerate(document_vectors(chunk_vectors, sections))
+        ],
+        wait=True,
+    )
+
+
+def source_filter(sources: List[str], key: str = SOURCE_PAYLOAD_KEY) -> models.Filter:
+    return models.Filter(must=[models.FieldCondition(key=key, match=models.MatchAny(any=sources))])
+
+
+def search_points(client: QdrantClient, collection_name: str, vector: List[float], limit: int,
+                  query_filter: Optional[models.Filter] = None) -> List[models.ScoredPoint]:
+    # query_points replaces search in newer qdrant-client releases; support both.
+    if hasattr(client, "query_points"):
+        return client.query_points(collection_name, query=vector, limit=limit, query_filter=query_filter, with_payload=True).points
+    return client.search(collection_name, query_vector=vector, limit=limit, query_filter=query_filter, with_payload=True)
+
+
+def top_documents(client: QdrantClient, doc_collection: str, vector: List[float], top_m: int) -> List[str]:
+    """Stage one: the `top_m` best-matching documents (by their best summary vector)."""
+    hits = search_points(client, doc_collection, vector, limit=top_m * DOC_INDEX_SECTIONS)
+    sources = []
+    for hit in hits:
+        source = hit.payload.get("source")
+        if source not in sources:
+            sources.append(source)
+            if len(sources) == top_m:
+                break
+    return sources
+
+
+def hierarchical_search(client: QdrantClient, chunk_collection: str, doc_collection: str, vector: List[float],
+                        k: int, top_m: int = HIERARCHICAL_TOP_DOCUMENTS) -> List[models.ScoredPoint]:
+    """Stage two: the top `k` chunks, searched only within the documents picked in stage one."""
+    sources = top_documents(client, doc_collection, vector, top_m)
+    if not sources:
+        return search_points(client, chunk_collection, vector, limit=k)
+    return search_points(client, chunk_collection, vector, limit=k, query_filter=source_filter(sources))
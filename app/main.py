@@ -5,16 +5,17 @@ import base64
 from typing import Dict, List
 
 from fastapi import FastAPI, Depends, HTTPException, Response, UploadFile, File
-from fastapi.responses import StreamingResponse
 
 from fastapi.middleware.cors import CORSMiddleware
+from starlette.concurrency import run_in_threadpool
 
 
-from . import auth, users, characters, rag_service, models
+from . import auth, users, characters, rag_service, models, metrics, admission
 from .database import engine
 from .schemas import Conversation, MessageInbound, User, SyncMessageResponse
 from .agent import run_agent_sync, run_agent_text_stream, available_agents
-from .audio_service import text_to_audio_sync, text_to_audio_stream
+from .audio_service import text_to_audio_sync, text_to_audio_stream, cached_audio_response
+from .audio_cache import cache as audio_cache
 
 # This command ensures all database tables are created on startup
 models.Base.metadata.create_all(bind=engine)
@@ -39,6 +40,10 @@ app.add_middleware(
     allow_headers=["*"], # Allow all headers
 )
 
+# Per-request trace IDs (X-Trace-ID header, also sent in the SSE stream)
+if metrics.TRACE_IDS_ENABLED:
+    app.add_middleware(metrics.TraceIdMiddleware)
+
 # --- Router Integration ---
 app.include_router(users.router, prefix="/v1/users", tags=["Users & Account Settings"])
 app.include_router(characters.router, prefix="/v1/characters", tags=["Characters"])
@@ -50,6 +55,13 @@ conversation_threads: Dict[str, List[dict]] = {}
 
 
 # --- API Endpoints ---
+@app.get("/metrics", include_in_schema=False)
+async def prometheus_metrics():
+    """Prometheus scrape endpoint for the latency histograms and counters in app/metrics.py."""
+    if not metrics.METRICS_ENABLED:
+        raise HTTPException(status_code=404, detail="Metrics are disabled.")
+    return Response(content=metrics.render_latest(), media_type=metrics.CONTENT_TYPE_LATEST)
+
 @app.get("/v1/agents", response_model=List[str], tags=["Agent Models"])
 async def list_available_agents(current_user: User = Depends(auth.get_current_user)):
     return list(available_agents.keys())
@@ -70,23 +82,31 @@ async def create_conversation(current_user: User = Depends(auth.get_current_user
 @app.post("/v1/conversations/message", response_model=SyncMessageResponse, tags=["Conversations"])
 async def send_sync_message(message_in: MessageInbound, current_user: User = Depends(auth.get_current_user)):
     history = conversation_threads[message_in.thread_id]
-    history.append({"role": "user", "content": message_in.message})
-    
-    # Directly call the sync agent with the selected LLM
-    text_response = await run_agent_sync(message_in.message, history, message_in.llm_model)
+    # Bounded concurrency per pool and per user; raises 429 with Retry-After when overloaded
+    async with admission.chat.admit(current_user.id):
+        history.append({"role": "user", "content": message_in.message})
+        # Directly call the sync agent with the selected LLM
+        text_response = await run_agent_sync(message_in.message, history, message_in.llm_model, message_in.agent_model)
     
     return SyncMessageResponse(thread_id=message_in.thread_id, response=text_response)
 
 @app.post("/v1/conversations/message/stream", tags=["Conversations"])
 async def stream_new_message(message_in: MessageInbound, current_user: User = Depends(auth.get_current_user)):
     history = conversation_threads[message_in.thread_id]
-    history.append({"role": "user", "content": message_in.message})
-    
-    # Directly call the streaming agent with the selected LLM
-    return StreamingResponse(
-        run_agent_text_stream(message_in.message, history, message_in.llm_model),
-        media_type="text/event-stream"
-    )
+    # The slot is held until the response is sent, however the stream ends.
+    slot = await admission.chat.acquire(current_user.id)
+    try:
+        history.append({"role": "user", "content": message_in.message})
+        
+        # Directly call the streaming agent with the selected LLM
+        return admission.AdmittedStreamingResponse(
+            run_agent_text_stream(message_in.message, history, message_in.llm_model, message_in.agent_model),
+            slot,
+            media_type="text/event-stream",
+        )
+    except BaseException:
+        slot.release()
+        raise
 # This is the endpoint that is currently missing from your running server
 @app.post("/v1/conversations/message/audio", tags=["Conversations"])
 async def download_audio_message(
@@ -94,15 +114,28 @@ async def download_audio_message(
     current_user: User = Depends(auth.get_current_user)
 ):
     """Generates and returns a downloadable MP3 audio file for a given text message."""
-    audio_bytes = await text_to_audio_sync(message_in.message)
+    # Replayed answers are served from the audio cache; disk hits go out as a file response.
+    cached = cached_audio_response(message_in.message)
+    if cached is not None:
+        return cached
+    async with admission.audio.admit(current_user.id):
+        # The lookup above already counted this request's miss.
+        audio_bytes = await text_to_audio_sync(message_in.message, check_cache=False)
     return Response(content=audio_bytes, media_type="audio/mpeg")
 
+@app.get("/v1/audio/cache", tags=["Conversations"])
+async def get_audio_cache_stats(current_user: User = Depends(auth.get_current_user)):
+    """Returns hit-rate and bytes-saved statistics for the TTS audio cache."""
+    return audio_cache.stats()
+
 @app.post("/v1/artifacts/upload", tags=["Artifacts"])
 async def upload_document(file: UploadFile = File(...), current_user: User = Depends(auth.get_current_user)):
     temp_dir = "temp_uploads"; os.makedirs(temp_dir, exist_ok=True); file_path = os.path.join(temp_dir, file.filename)
     try:
         with open(file_path, "wb") as buffer: shutil.copyfileobj(file.file, buffer)
-        success = rag_service.add_document_to_vector_store(file_path, file.filename)
+        # Ingestion is CPU-bound; run it off the event loop, at most a few at a time.
+        async with admission.ingestion.admit(current_user.id):
+            success = await run_in_threadpool(rag_service.add_document_to_vector_store, file_path, file.filename)
         if success: return {"filename": file.filename, "status": "Successfully uploaded and processed."}
         else: raise HTTPException(status_code=500, detail="Failed to process document.")
     finally:
@@ -0,0 +1,256 @@
+import os
+import time
+import uuid
+import functools
+import inspect
+from contextvars import ContextVar
+from typing import Callable, Optional
+
+from langchain_core.callbacks import BaseCallbackHandler
+
+# --- Configuration ---
+METRICS_ENABLED = os.environ.get("METRICS_ENABLED", "true").lower() == "true"
+TRACE_IDS_ENABLED = os.environ.get("TRACE_IDS_ENABLED", "false").lower() == "true"
+TRACE_HEADER = "x-trace-id"
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+FAST_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0)
+SIZE_BUCKETS = (1, 2, 4, 8, 16, 32, 64, 128, 256, 512)
+TOKEN_BUCKETS = (64, 128, 256, 512, 1024, 2048, 4096, 8192, 16384)
+
+
+class _NoopMetric:
+    """Stands in for every metric when METRICS_ENABLED is false, so call sites stay unconditional."""
+
+    def labels(self, *args, **kwargs):
+        return self
+
+    def observe(self, value):
+        pass
+
+    def inc(self, amount=1):
+        pass
+
+    def dec(self, amount=1):
+        pass
+
+    def set(self, value):
+        pass
+
+    def set_function(self, fn):
+        pass
+
+
+_NOOP = _NoopMetric()
+
+if METRICS_ENABLED:
+    from prometheus_client import CollectorRegistry, Counter, Gauge, Histogram, generate_latest, CONTENT_TYPE_LATEST
+
+    registry = CollectorRegistry()
+
+    def histogram(name: str, documentation: str, labelnames=(), buckets=LATENCY_BUCKETS):
+        return Histogram(name, documentation, labelnames, buckets=buckets, registry=registry)
+
+    def counter(name: str, documentation: str, labelnames=()):
+        return Counter(name, documentation, labelnames, registry=registry)
+
+    def gauge(name: str, documentation: str, labelnames=()):
+        return Gauge(name, documentation, labelnames, registry=registry)
+else:
+    registry = None
+    CONTENT_TYPE_LATEST = "text/plain; version=0.0.4; charset=utf-8"
+
+    def histogram(name: str, documentation: str, labelnames=(), buckets=LATENCY_BUCKETS):
+        return _NOOP
+
+    def counter(name: str, documentation: str, labelnames=()):
+        return _NOOP
+
+    def gauge(name: str, documentation: str, labelnames=()):
+        return _NOOP
+
+
+# --- Metric definitions ---
+GRAPH_NODE_SECONDS = histogram("knobot_graph_node_seconds", "Time spent in each LangGraph node.", ["node"])
+EMBEDDING_SECONDS = histogram("knobot_embedding_batch_seconds", "Time to embed one batch.", ["backend", "kind"], FAST_BUCKETS + (2.5, 5.0, 10.0))
+EMBEDDING_BATCH_SIZE = histogram("knobot_embedding_batch_size", "Texts per embedding call.", ["backend", "kind"], SIZE_BUCKETS)
+QDRANT_SECONDS = histogram("knobot_qdrant_seconds", "Latency of Qdrant client calls.", ["operation"], FAST_BUCKETS + (2.5, 5.0))
+RETRIEVAL_STAGE_SECONDS = histogram("knobot_retrieval_stage_seconds", "Multi-query retrieval time per stage.", ["stage"], FAST_BUCKETS + (2.5, 5.0))
+CONTEXT_TOKENS = histogram("knobot_prompt_tokens", "Prompt tokens sent to the LLM per request.", [], TOKEN_BUCKETS)
+LLM_TTFT_SECONDS = histogram("knobot_llm_time_to_first_token_seconds", "LLM time to first streamed token.", ["model"])
+LLM_SECONDS = histogram("knobot_llm_seconds", "Total LLM call duration.", ["model"])
+LLM_TOKENS = counter("knobot_llm_tokens_total", "Tokens reported by the LLM API.", ["model", "kind"])
+TTS_SECONDS = histogram("knobot_tts_seconds", "Latency of text-to-speech API calls (cache misses only).", ["mode"])
+INGEST_SECONDS = histogram("knobot_ingest_stage_seconds", "Time per document ingestion stage.", ["stage"])
+DB_QUERY_SECONDS = histogram("knobot_db_query_seconds", "Database statement latency.", ["statement"], FAST_BUCKETS)
+ADMISSION_IN_FLIGHT = gauge("knobot_admission_in_flight", "Requests currently holding an admission slot.", ["pool"])
+ADMISSION_QUEUE_DEPTH = gauge("knobot_admission_queue_depth", "Requests waiting for an admission slot.", ["pool"])
+ADMISSION_WAIT_SECONDS = histogram("knobot_admission_wait_seconds", "Time spent waiting for an admission slot.", ["pool"])
+COALESCED_REQUESTS = counter("knobot_coalesced_requests_total", "Chat requests that started (leader) or joined (follower) a graph run.", ["mode", "role"])
+ADMISSION_REJECTIONS = counter("knobot_admission_rejections_total", "Requests rejected with 429.", ["pool", "reason"])
+
+
+class _Timer:
+    __slots__ = ("metric", "start")
+
+    def __init__(self, metric):
+        self.metric = metric
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.metric.observe(time.perf_counter() - self.start)
+        return False
+
+
+class _NoopTimer:
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+_NOOP_TIMER = _NoopTimer()
+
+
+def timer(metric, **labels):
+    """Context manager that observes the elapsed time on `metric` (a no-op when metrics are disabled)."""
+    if not METRICS_ENABLED:
+        return _NOOP_TIMER
+    return _Timer(metric.labels(**labels) if labels else metric)
+
+
+def timed_node(name: str):
+    """Decorator timing a LangGraph node; keeps the signature so LangGraph still passes `config`."""
+    def decorator(fn: Callable):
+        if not METRICS_ENABLED:
+            return fn
+        if inspect.iscoroutinefunction(fn):
+            @functools.wraps(fn)
+            async def async_wrapper(*args, **kwargs):
+                with timer(GRAPH_NODE_SECONDS, node=name):
+                    return await fn(*args, **kwargs)
+            return async_wrapper
+
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            with timer(GRAPH_NODE_SECONDS, node=name):
+                return fn(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def gauge_callback(name: str, documentation: str, fn: Callable[[], float]):
+    """Registers a gauge whose value is computed by `fn` at scrape time."""
+    gauge(name, documentation).set_function(fn)
+
+
+def render_latest() -> bytes:
+    return generate_latest(registry) if METRICS_ENABLED else b""
+
+
+# --- LLM callbacks ---
+class LLMMetricsCallback(BaseCallbackHandler):
+    """Records time to first token, total duration and token usage of every chat model run."""
+
+    def __init__(self):
+        self._runs = {}
+
+    def on_chat_model_start(self, serialized, messages, *, run_id, **kwargs):
+        params = kwargs.get("invocation_params") or {}
+        model = params.get("model") or params.get("model_name") or "unknown"
+        self._runs[run_id] = [time.perf_counter(), False, model]
+
+    def on_llm_new_token(self, token, *, run_id, **kwargs):
+        run = self._runs.get(run_id)
+        if run is not None and not run[1]:
+            run[1] = True
+            LLM_TTFT_SECONDS.labels(model=run[2]).observe(time.perf_counter() - run[0])
+
+    def on_llm_end(self, response, *, run_id, **kwargs):
+        run = self._runs.pop(run_id, None)
+        if run is None:
+            return
+        LLM_SECONDS.labels(model=run[2]).observe(time.perf_counter() - run[0])
+        usage = None
+        try:
+            usage = response.generations[0][0].message.usage_metadata
+        except (AttributeError, IndexError):
+            pass
+        if usage:
+            LLM_TOKENS.labels(model=run[2], kind="prompt").inc(usage.get("input_tokens", 0))
+            LLM_TOKENS.labels(model=run[2], kind="completion").inc(usage.get("output_tokens", 0))
+
+    def on_llm_error(self, error, *, run_id, **kwargs):
+        self._runs.pop(run_id, None)
+
+
+llm_callback = LLMMetricsCallback()
+
+
+def instrument_engine(engine):
+    """Times every SQL statement executed through a SQLAlchemy engine."""
+    if not METRICS_ENABLED:
+        return
+    from sqlalchemy import event
+
+    @event.listens_for(engine, "before_cursor_execute")
+    def _before(conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault("query_start", []).append(time.perf_counter())
+
+    @event.listens_for(engine, "after_cursor_execute")
+    def _after(conn, cursor, statement, parameters, context, executemany):
+        start = conn.info["query_start"].pop()
+        verb = statement.lstrip().split(" ", 1)[0].upper() or "OTHER"
+        DB_QUERY_SECONDS.labels(statement=verb).observe(time.perf_counter() - start)
+
+    @event.listens_for(engine, "handle_error")
+    def _error(context):
+        starts = context.connection.info.get("query_start") if context.connection is not None else None
+        if starts:
+            starts.pop()
+
+
+# --- Trace IDs ---
+_trace_id: ContextVar[Optional[str]] = ContextVar("trace_id", default=None)
+
+
+def current_trace_id() -> Optional[str]:
+    return _trace_id.get()
+
+
+def log(tag: str, message: str):
+    trace_id = _trace_id.get()
+    print(f"[{tag} {trace_id}] {message}" if trace_id else f"[{tag}] {message}")
+
+
+class TraceIdMiddleware:
+    """
+    ASGI middleware giving every HTTP request a trace ID (taken from the `X-Trace-ID` header
+    or generated). It is visible to all code handling the request, including streamed
+    response bodies, and echoed back in the response headers.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        incoming = dict(scope.get("headers") or []).get(TRACE_HEADER.encode())
+        trace_id = incoming.decode("latin-1")[:64] if incoming else uuid.uuid4().hex
+        token = _trace_id.set(trace_id)
+
+        async def send_with_trace(message):
+            if message["type"] == "http.response.start":
+                message["headers"] = list(message.get("headers", [])) + [(TRACE_HEADER.encode(), trace_id.encode())]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_trace)
+        finally:
+            _trace_id.reset(token)
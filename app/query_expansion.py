@@ -0,0 +1,98 @@
+import os
+import re
+from typing import Dict, List, Optional
+
+from langchain_core.documents import Document
+from langchain_core.messages import HumanMessage, SystemMessage
+
+from . import metrics
+
+# --- Configuration ---
+# "llm" asks a cheap model for paraphrases; "rules" is deterministic and needs no API key.
+MULTI_QUERY_EXPANDER = os.environ.get("MULTI_QUERY_EXPANDER", "llm")
+MULTI_QUERY_MODEL = os.environ.get("MULTI_QUERY_MODEL", "gpt-4o-mini")
+MULTI_QUERY_COUNT = int(os.environ.get("MULTI_QUERY_COUNT", 3))
+MULTI_QUERY_K = int(os.environ.get("MULTI_QUERY_K", 4))
+MULTI_QUERY_TOP_K = int(os.environ.get("MULTI_QUERY_TOP_K", 6))
+RRF_K = 60
+
+# Events from the expansion model carry this tag so they are never streamed to the user.
+EXPANSION_TAG = "query_expansion"
+
+EXPANSION_PROMPT = """You rewrite questions into search queries for a document retrieval system.
+Write {n} different search queries that would help find the passages answering the user's question.
+Use paraphrases, synonyms, and split multi-part questions into separate queries.
+Return one query per line with no numbering and no extra text."""
+
+STOPWORDS = set("""
+a an the is are was were be been being do does did of to in on for with about at by from and or
+what which who whom whose when where why how can could should would will shall may might must
+i me my we our you your it its this that these those there please tell explain describe
+""".split())
+QUESTION_PREFIX = re.compile(r"^(what|which|who|when|where|why|how)\s+(is|are|was|were|do|does|did|can|could|should|would|will)\s+", re.I)
+
+
+def rule_based_expansions(question: str, n: int = MULTI_QUERY_COUNT) -> List[str]:
+    """Cheap, deterministic rewrites: keywords only, statement form and one query per clause."""
+    expansions = []
+    words = re.findall(r"[\w'-]+", question.lower())
+    keywords = [w for w in words if w not in STOPWORDS]
+    if keywords:
+        expansions.append(" ".join(keywords))
+    statement = QUESTION_PREFIX.sub("", question.strip()).rstrip("?").strip()
+    if statement:
+        expansions.append(statement)
+    clauses = [c.strip(" ?.") for c in re.split(r"\s+and\s+|;|,\s*(?:and\s+)?", question) if len(c.split()) >= 3]
+    if len(clauses) > 1:
+        expansions.extend(clauses)
+    return expansions[:n]
+
+
+async def llm_expansions(question: str, n: int = MULTI_QUERY_COUNT) -> List[str]:
+    from langchain_openai import ChatOpenAI
+
+    llm = ChatOpenAI(model=MULTI_QUERY_MODEL, temperature=0, tags=[EXPANSION_TAG], callbacks=[metrics.llm_callback])
+    response = await llm.ainvoke([SystemMessage(content=EXPANSION_PROMPT.format(n=n)), HumanMessage(content=question)])
+    lines = [re.sub(r"^\s*(?:[-*•]|\d+[.)])\s*", "", line).strip() for line in response.content.splitlines()]
+    return [line for line in lines if line][:n]
+
+
+async def expand_query(question: str, n: int = MULTI_QUERY_COUNT, expander: str = MULTI_QUERY_EXPANDER) -> List[str]:
+    """Returns up to `n` extra queries for `question` (never including the question itself)."""
+    if expander == "llm":
+        try:
+            expansions = await llm_expansions(question, n)
+        except Exception as e:
+            print(f"Query expansion via {MULTI_QUERY_MODEL} failed ({e}); using rule-based expansion.")
+            expansions = rule_based_expansions(question, n)
+    else:
+        expansions = rule_based_expansions(question, n)
+
+    seen = {" ".join(question.lower().split())}
+    unique = []
+    for query in expansions:
+        normalized = " ".join(query.lower().split())
+        if normalized and normalized not in seen:
+            seen.add(normalized)
+            unique.append(query)
+    return unique
+
+
+def _doc_key(doc: Document):
+    chunk_id = doc.metadata.get("chunk_id")
+    return (doc.metadata.get("source"), chunk_id) if chunk_id is not None else doc.page_content
+
+
+def reciprocal_rank_fusion(result_lists: List[List[Document]], k: int = RRF_K, limit: Optional[int] = None) -> List[Document]:
+    """Fuses several ranked lists: score(d) = sum over lists of 1 / (k + rank of d)."""
+    scores: Dict[object, float] = {}
+    docs: Dict[object, Document] = {}
+    for results in result_lists:
+        for rank, doc in enumerate(results, start=1):
+            key = _doc_key(doc)
+            scores[key] = scores.get(key, 0.0) + 1.0 / (k + rank)
+            docs.setdefault(key, doc)
+    fused = sorted(scores, key=scores.get, reverse=True)[:limit]
+    for key in fused:
+        docs[key].metadata["rrf_score"] = scores[key]
+    return [docs[key] for key in fused]
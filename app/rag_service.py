@@ -1,18 +1,43 @@
 import os
+import uuid
+from typing import List
 from langchain_community.document_loaders import PyPDFLoader
-from langchain_text_splitters import RecursiveCharacterTextSplitter
-from langchain_huggingface import HuggingFaceEmbeddings
+from langchain_core.documents import Document
+from langchain_core.retrievers import BaseRetriever
 from langchain_qdrant import Qdrant
 from qdrant_client import QdrantClient, models
 import time
+from . import metrics, hierarchical
+from .hierarchical import RETRIEVAL_MODE, DOC_INDEX_COLLECTION_NAME, HIERARCHICAL_TOP_DOCUMENTS
+from .embeddings import create_embeddings, EMBEDDING_BACKEND
+from .chunking import create_text_splitter, CHUNKING_STRATEGY
 
 # --- Configuration ---
 QDRANT_URL = os.environ.get("QDRANT_URL", "http://localhost:6333")
 COLLECTION_NAME = "wattos_ai_documents"
+UPSERT_BATCH_SIZE = 256
 
 # --- Service Initialization ---
-embeddings_model = HuggingFaceEmbeddings(model_name="all-MiniLM-L6-v2")
-qdrant_client = QdrantClient(url=QDRANT_URL)
+# Pluggable backend: torch (default), onnx or onnx-int8, see app/embeddings.py
+embeddings_model = create_embeddings(EMBEDDING_BACKEND)
+
+class InstrumentedQdrantClient(QdrantClient):
+    """QdrantClient that records the latency of the calls made by search and ingestion."""
+
+def _timed_qdrant_method(operation: str):
+    method = getattr(QdrantClient, operation)
+    def timed(self, *args, **kwargs):
+        with metrics.timer(metrics.QDRANT_SECONDS, operation=operation):
+            return method(self, *args, **kwargs)
+    timed.__name__ = operation
+    timed.__doc__ = method.__doc__
+    return timed
+
+for _operation in ("search", "search_batch", "query_points", "query_batch_points", "upsert", "scroll", "delete"):
+    if hasattr(QdrantClient, _operation):
+        setattr(InstrumentedQdrantClient, _operation, _timed_qdrant_method(_operation))
+
+qdrant_client = InstrumentedQdrantClient(url=QDRANT_URL)
 
 def check_qdrant_connection():
     max_retries = 5
@@ -28,15 +53,22 @@ def check_qdrant_connection():
     return False
 
 if check_qdrant_connection():
+    # Chunks, plus a small document-level collection of per-document summary vectors
+    for collection_name in (COLLECTION_NAME, DOC_INDEX_COLLECTION_NAME):
+        try:
+            qdrant_client.recreate_collection(
+                collection_name=collection_name,
+                vectors_config=models.VectorParams(size=384, distance=models.Distance.COSINE),
+            )
+            print(f"Qdrant collection '{collection_name}' created successfully.")
+        except Exception:
+            print(f"Qdrant collection '{collection_name}' may already exist.")
     try:
-        # We only need a simple collection, no special text index needed for basic RAG.
-        qdrant_client.recreate_collection(
-            collection_name=COLLECTION_NAME,
-            vectors_config=models.VectorParams(size=384, distance=models.Distance.COSINE),
-        )
-        print(f"Qdrant collection '{COLLECTION_NAME}' created successfully.")
+        # Keyword index so hierarchical retrieval can filter chunks by document cheaply
+        qdrant_client.create_payload_index(COLLECTION_NAME, hierarchical.SOURCE_PAYLOAD_KEY, models.PayloadSchemaType.KEYWORD)
+        qdrant_client.create_payload_index(DOC_INDEX_COLLECTION_NAME, "source", models.PayloadSchemaType.KEYWORD)
     except Exception:
-        print(f"Qdrant collection '{COLLECTION_NAME}' may already exist.")
+        print("Qdrant payload indexes may already exist.")
 else:
     exit("Exiting: Qdrant connection failed.")
 
@@ -46,24 +78,77 @@ vector_store = Qdrant(
     embeddings=embeddings_model,
 )
 
+# Token-aligned sentence chunks by default, see app/chunking.py
+text_splitter = create_text_splitter(CHUNKING_STRATEGY)
+
 # In-memory store for document names
 uploaded_files_db = []
+# Bumped on every ingestion so cached/coalesced answers never span different document sets
+document_generation = 0
 
 def add_document_to_vector_store(file_path: str, file_name: str):
-    loader = PyPDFLoader(file_path)
-    documents = loader.load()
-    text_splitter = RecursiveCharacterTextSplitter(chunk_size=1000, chunk_overlap=100)
-    chunks = text_splitter.split_documents(documents)
+    with metrics.timer(metrics.INGEST_SECONDS, stage="load"):
+        loader = PyPDFLoader(file_path)
+        documents = loader.load()
+    with metrics.timer(metrics.INGEST_SECONDS, stage="split"):
+        chunks = text_splitter.split_documents(documents)
     for i, chunk in enumerate(chunks):
         chunk.metadata = {"source": file_name, "chunk_id": i}
-    vector_store.add_documents(chunks)
+    if chunks:
+        # Embed once; the vectors feed both the chunk collection and the document summary index.
+        with metrics.timer(metrics.INGEST_SECONDS, stage="embed"):
+            vectors = embeddings_model.embed_documents([chunk.page_content for chunk in chunks])
+        with metrics.timer(metrics.INGEST_SECONDS, stage="upsert"):
+            for start in range(0, len(chunks), UPSERT_BATCH_SIZE):
+                qdrant_client.upsert(
+                    collection_name=COLLECTION_NAME,
+                    points=[
+                        models.PointStruct(
+                            id=uuid.uuid4().hex,
+                            vector=vector,
+                            payload={vector_store.content_payload_key: chunk.page_content,
+                                     vector_store.metadata_payload_key: chunk.metadata},
+                        )
+                        for chunk, vector in zip(chunks[start : start + UPSERT_BATCH_SIZE], vectors[start : start + UPSERT_BATCH_SIZE])
+                    ],
+                    wait=True,
+                )
+        with metrics.timer(metrics.INGEST_SECONDS, stage="summarize"):
+            hierarchical.index_document(qdrant_client, DOC_INDEX_COLLECTION_NAME, file_name, vectors)
     if file_name not in uploaded_files_db:
         uploaded_files_db.append(file_name)
+    global document_generation
+    document_generation += 1
     return True
 
-def get_retriever():
-    """Returns a simple retriever for the RAG agent."""
-    return vector_store.as_retriever()
+def search_by_vector(vector: List[float], k: int = 4) -> List[Document]:
+    """Top `k` chunks for an already embedded query, using the configured RETRIEVAL_MODE."""
+    if RETRIEVAL_MODE != "hierarchical":
+        return vector_store.similarity_search_by_vector(vector, k=k)
+    points = hierarchical.hierarchical_search(
+        qdrant_client, COLLECTION_NAME, DOC_INDEX_COLLECTION_NAME, vector, k, HIERARCHICAL_TOP_DOCUMENTS
+    )
+    return [
+        Document(page_content=point.payload.get(vector_store.content_payload_key, ""),
+                 metadata=point.payload.get(vector_store.metadata_payload_key) or {})
+        for point in points
+    ]
+
+class HierarchicalRetriever(BaseRetriever):
+    """Picks the best documents from the summary index first, then searches only their chunks."""
+    k: int = 4
+
+    def _get_relevant_documents(self, query: str, *, run_manager) -> List[Document]:
+        return search_by_vector(embeddings_model.embed_query(query), self.k)
+
+def get_retriever(k: int = 4):
+    """Returns a simple retriever for the RAG agent that fetches the top `k` chunks."""
+    if RETRIEVAL_MODE == "hierarchical":
+        return HierarchicalRetriever(k=k)
+    return vector_store.as_retriever(search_kwargs={"k": k})
+
+def get_document_generation() -> int:
+    return document_generation
 
 def get_uploaded_files():
     """Returns a list of uploaded file names."""
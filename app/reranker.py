@@ -0,0 +1,56 @@
+import os
+import threading
+import time
+from typing import List, Tuple
+
+from langchain_core.documents import Document
+
+# --- Configuration ---
+RERANK_MODEL = os.environ.get("RERANK_MODEL", "cross-encoder/ms-marco-MiniLM-L-6-v2")
+# How many candidates are pulled from Qdrant, and how many survive reranking.
+RERANK_CANDIDATES = int(os.environ.get("RERANK_CANDIDATES", 20))
+RERANK_TOP_K = int(os.environ.get("RERANK_TOP_K", 4))
+RERANK_MAX_LENGTH = int(os.environ.get("RERANK_MAX_LENGTH", 256))
+RERANK_THREADS = int(os.environ.get("RERANK_THREADS", 4))
+
+_cross_encoder = None
+_cross_encoder_lock = threading.Lock()
+
+
+def get_cross_encoder():
+    """Loads the CPU cross-encoder on first use, so the default agent never pays for it."""
+    global _cross_encoder
+    if _cross_encoder is None:
+        with _cross_encoder_lock:
+            if _cross_encoder is None:
+                import torch
+                from sentence_transformers import CrossEncoder
+
+                # Note: torch's intra-op thread count is process wide.
+                torch.set_num_threads(RERANK_THREADS)
+                _cross_encoder = CrossEncoder(RERANK_MODEL, max_length=RERANK_MAX_LENGTH, device="cpu")
+    return _cross_encoder
+
+
+def rerank(query: str, docs: List[Document], top_k: int = RERANK_TOP_K) -> Tuple[List[Document], float]:
+    """
+    Scores every (query, chunk) pair in one batched forward pass and keeps the best `top_k`.
+
+    Returns:
+        tuple: The reranked documents (best first, with a `rerank_score` in their metadata)
+        and the time spent scoring, in seconds.
+    """
+    if not docs:
+        return [], 0.0
+    model = get_cross_encoder()
+    start = time.perf_counter()
+    scores = model.predict(
+        [(query, doc.page_content) for doc in docs],
+        batch_size=len(docs),
+        show_progress_bar=False,
+    )
+    elapsed = time.perf_counter() - start
+    ranked = sorted(zip(docs, scores), key=lambda pair: pair[1], reverse=True)[:top_k]
+    for doc, score in ranked:
+        doc.metadata["rerank_score"] = float(score)
+    return [doc for doc, _ in ranked], elapsed
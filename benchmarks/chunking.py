@@ -0,0 +1,119 @@
+"""
+Character splitter (1000 chars / 100 overlap) versus the tokenizer-aligned sentence splitter.
+
+A synthetic corpus of "pages" of filler sentences hides one unique fact per page at a random
+position; each fact has a matching question. For each strategy we report split time, embedding
+time, ingestion throughput, chunk count, how many chunks exceed the embedding window (and are
+therefore truncated by the model), how many chunk boundaries within a page carry overlapping text
+and recall@k of a brute-force cosine search over the chunks.
+
+Usage:
+    python benchmarks/chunking.py --pages 300 --backend onnx --k 1 3 5
+"""
+import argparse
+import os
+import random
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from langchain_core.documents import Document  # noqa: E402
+
+from app.chunking import create_text_splitter  # noqa: E402
+from app.embeddings import EMBEDDING_MAX_TOKENS, create_embeddings, load_tokenizer  # noqa: E402
+
+SUBJECTS = ["The quarterly report", "Our support team", "The installation guide", "Each regional office",
+            "The safety committee", "The updated warranty", "The billing department", "Every field technician"]
+VERBS = ["reviews", "describes", "summarises", "documents", "tracks", "explains", "approves", "updates"]
+OBJECTS = ["maintenance schedules for rooftop units", "customer feedback from the last survey",
+           "the escalation path for urgent tickets", "energy usage across all sites",
+           "training requirements for new staff", "inventory levels of spare parts",
+           "the procedure for replacing inverter fuses", "delivery times for international orders"]
+CLAUSES = ["", " in accordance with the internal policy", " before the end of each month",
+           " whenever a change request is approved by management", " using the shared reporting template"]
+
+
+def filler_sentence(rng: random.Random) -> str:
+    return f"{rng.choice(SUBJECTS)} {rng.choice(VERBS)} {rng.choice(OBJECTS)}{rng.choice(CLAUSES)}."
+
+
+def build_corpus(pages: int, sentences_per_page: int, seed: int = 0):
+    rng = random.Random(seed)
+    documents, questions = [], []
+    for page in range(pages):
+        code = rng.randint(1000, 9999)
+        fact = f"The access code for storage vault {page} is {code}."
+        sentences = [filler_sentence(rng) for _ in range(sentences_per_page)]
+        sentences.insert(rng.randrange(len(sentences) + 1), fact)
+        documents.append(Document(page_content=" ".join(sentences), metadata={"page": page}))
+        questions.append((f"What is the access code for storage vault {page}?", str(code)))
+    return documents, questions
+
+
+def shares_overlap(previous: str, current: str, min_chars: int = 5) -> bool:
+    """True if `current` starts with text that `previous` ends with."""
+    return any(previous.endswith(current[:size]) for size in range(min(len(previous), len(current)), min_chars - 1, -1))
+
+
+def evaluate(strategy: str, documents, questions, embeddings, tokenizer, ks):
+    splitter = create_text_splitter(strategy)
+    start = time.perf_counter()
+    chunks = splitter.split_documents(documents)
+    split_s = time.perf_counter() - start
+
+    start = time.perf_counter()
+    vectors = np.array(embeddings.embed_documents([c.page_content for c in chunks]), dtype=np.float32)
+    embed_s = time.perf_counter() - start
+
+    lengths = [len(e.ids) + 2 for e in tokenizer.encode_batch([c.page_content for c in chunks], add_special_tokens=False)]
+    truncated = sum(length > EMBEDDING_MAX_TOKENS for length in lengths)
+    boundaries = [(a, b) for a, b in zip(chunks, chunks[1:]) if a.metadata["page"] == b.metadata["page"]]
+    overlapping = sum(shares_overlap(a.page_content, b.page_content) for a, b in boundaries)
+
+    query_vectors = np.array(embeddings.embed_documents([q for q, _ in questions]), dtype=np.float32)
+    vectors /= np.linalg.norm(vectors, axis=1, keepdims=True)
+    query_vectors /= np.linalg.norm(query_vectors, axis=1, keepdims=True)
+    ranking = np.argsort(-(query_vectors @ vectors.T), axis=1)
+    recall = {}
+    for k in ks:
+        hits = sum(any(answer in chunks[idx].page_content for idx in ranking[qi, :k]) for qi, (_, answer) in enumerate(questions))
+        recall[k] = hits / len(questions)
+
+    return {
+        "strategy": strategy,
+        "chunks": len(chunks),
+        "mean_tokens": float(np.mean(lengths)),
+        "truncated": truncated,
+        "overlap": f"{overlapping}/{len(boundaries)}",
+        "split_s": split_s,
+        "embed_s": embed_s,
+        "pages_per_s": len(documents) / (split_s + embed_s),
+        "recall": recall,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--pages", type=int, default=300)
+    parser.add_argument("--sentences-per-page", type=int, default=40)
+    parser.add_argument("--backend", default="torch", help="embedding backend: torch, onnx or onnx-int8")
+    parser.add_argument("--k", type=int, nargs="+", default=[1, 3, 5])
+    args = parser.parse_args()
+
+    documents, questions = build_corpus(args.pages, args.sentences_per_page)
+    embeddings = create_embeddings(args.backend)
+    tokenizer = load_tokenizer()
+    print(f"{args.pages} pages x {args.sentences_per_page} sentences, backend={args.backend}\n")
+    header = f"{'strategy':<11} {'chunks':>7} {'avg tok':>8} {'>window':>8} {'overlap':>9} {'split s':>8} {'embed s':>8} {'pages/s':>8}"
+    print(header + "".join(f" {'R@' + str(k):>6}" for k in args.k))
+    for strategy in ("characters", "tokens"):
+        r = evaluate(strategy, documents, questions, embeddings, tokenizer, args.k)
+        print(f"{r['strategy']:<11} {r['chunks']:>7} {r['mean_tokens']:>8.0f} {r['truncated']:>8} {r['overlap']:>9} {r['split_s']:>8.2f} "
+              f"{r['embed_s']:>8.2f} {r['pages_per_s']:>8.1f}" + "".join(f" {r['recall'][k]:>6.2f}" for k in args.k))
+
+
+if __name__ == "__main__":
+    main()
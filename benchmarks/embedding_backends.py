@@ -0,0 +1,98 @@
+"""
+Compares the embedding backends: import+load time, sentences/sec, peak RSS and parity with torch.
+
+Every backend runs in its own subprocess so that import time and RSS are not polluted by the
+others (torch in particular). Parity is the lowest cosine similarity to the torch embeddings.
+
+Usage:
+    python benchmarks/embedding_backends.py --backends torch onnx onnx-int8 --sentences 2000 --threads 4
+"""
+import argparse
+import json
+import os
+import random
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+WORDS = ("the warranty covers battery replacement for devices purchased from authorised resellers and "
+         "customers may request a refund within thirty days if the product arrives damaged or incomplete").split()
+
+
+def synthetic_sentences(count: int, seed: int = 0) -> list:
+    # Mix of short questions and long chunk-like passages, like real query + ingestion traffic.
+    rng = random.Random(seed)
+    return [" ".join(rng.choice(WORDS) for _ in range(rng.choice([8, 16, 40, 120, 200]))) for _ in range(count)]
+
+
+def worker(backend: str, sentences: int, output_path: str):
+    start = time.perf_counter()
+    from app.embeddings import create_embeddings
+
+    embeddings = create_embeddings(backend)
+    load_seconds = time.perf_counter() - start
+
+    texts = synthetic_sentences(sentences)
+    embeddings.embed_documents(texts[:32])  # warm-up
+    start = time.perf_counter()
+    vectors = embeddings.embed_documents(texts)
+    encode_seconds = time.perf_counter() - start
+
+    np.save(output_path, np.array(vectors, dtype=np.float32))
+    print(json.dumps({
+        "backend": backend,
+        "load_s": load_seconds,
+        "sentences_per_s": len(texts) / encode_seconds,
+        "peak_rss_mb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+    }))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--backends", nargs="+", default=["torch", "onnx", "onnx-int8"])
+    parser.add_argument("--sentences", type=int, default=2000)
+    parser.add_argument("--threads", type=int, default=4)
+    parser.add_argument("--worker", help=argparse.SUPPRESS)
+    parser.add_argument("--output", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.worker:
+        worker(args.worker, args.sentences, args.output)
+        return
+
+    env = dict(os.environ, EMBEDDING_THREADS=str(args.threads), OMP_NUM_THREADS=str(args.threads))
+    results, vectors = [], {}
+    with tempfile.TemporaryDirectory() as tmp:
+        for backend in args.backends:
+            output = os.path.join(tmp, f"{backend}.npy")
+            proc = subprocess.run(
+                [sys.executable, __file__, "--worker", backend, "--sentences", str(args.sentences), "--output", output],
+                cwd=ROOT, env=env, capture_output=True, text=True,
+            )
+            if proc.returncode != 0:
+                print(f"{backend}: failed\n{proc.stderr[-2000:]}")
+                continue
+            results.append(json.loads(proc.stdout.strip().splitlines()[-1]))
+            vectors[backend] = np.load(output)
+
+    reference = vectors.get("torch")
+    print(f"{args.sentences} sentences, {args.threads} threads\n")
+    print(f"{'backend':<10} {'load s':>7} {'sent/s':>9} {'peak RSS MB':>12} {'min cos vs torch':>17}")
+    for r in results:
+        parity = "-"
+        if reference is not None and r["backend"] != "torch":
+            a, b = vectors[r["backend"]], reference
+            cos = (a * b).sum(axis=1) / (np.linalg.norm(a, axis=1) * np.linalg.norm(b, axis=1))
+            parity = f"{cos.min():.4f}"
+        print(f"{r['backend']:<10} {r['load_s']:>7.2f} {r['sentences_per_s']:>9.1f} {r['peak_rss_mb']:>12.0f} {parity:>17}")
+
+
+if __name__ == "__main__":
+    main()
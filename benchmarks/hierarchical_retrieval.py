@@ -0,0 +1,132 @@
+"""
+Flat chunk search versus two-stage hierarchical retrieval (document summary index, then a
+payload-filtered chunk search inside the best documents).
+
+Synthetic 384-dim chunk vectors are grouped into documents around a per-document topic and
+section centre, so documents behave like real files with a few sub-topics each. Queries are
+noisy copies of random chunks. Ground truth is an exact numpy search over all chunks. For each
+corpus size we report p50/p95 query latency and recall@k of both modes against that ground truth.
+
+Usage:
+    python benchmarks/hierarchical_retrieval.py --url http://localhost:6333 --sizes 10000 100000 1000000
+    python benchmarks/hierarchical_retrieval.py --local --sizes 10000 50000
+"""
+import argparse
+import os
+import sys
+import time
+import uuid
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from qdrant_client import QdrantClient, models  # noqa: E402
+
+from app.hierarchical import (  # noqa: E402
+    DOC_INDEX_SECTIONS, HIERARCHICAL_TOP_DOCUMENTS, SOURCE_PAYLOAD_KEY, document_vectors, hierarchical_search, search_points,
+)
+
+DIM = 384
+UPSERT_BATCH = 1024
+
+
+def normalize(x: np.ndarray) -> np.ndarray:
+    return x / np.linalg.norm(x, axis=-1, keepdims=True)
+
+
+def build_corpus(chunks: int, chunks_per_doc: int, sections: int, rng: np.random.Generator):
+    docs = max(1, chunks // chunks_per_doc)
+    topics = normalize(rng.standard_normal((docs, DIM), dtype=np.float32))
+    section_centres = normalize(topics[:, None, :] + 0.6 * rng.standard_normal((docs, sections, DIM), dtype=np.float32))
+    doc_ids = np.arange(chunks) % docs
+    section_ids = (np.arange(chunks) // docs) * sections // max(1, -(-chunks // docs))
+    vectors = normalize(section_centres[doc_ids, section_ids] + 0.9 * rng.standard_normal((chunks, DIM), dtype=np.float32))
+    return vectors.astype(np.float32), doc_ids
+
+
+def load(client: QdrantClient, chunk_collection: str, doc_collection: str, vectors, doc_ids, sections: int):
+    for name in (chunk_collection, doc_collection):
+        client.recreate_collection(name, vectors_config=models.VectorParams(size=DIM, distance=models.Distance.COSINE))
+    client.create_payload_index(chunk_collection, SOURCE_PAYLOAD_KEY, models.PayloadSchemaType.KEYWORD)
+    for start in range(0, len(vectors), UPSERT_BATCH):
+        end = min(start + UPSERT_BATCH, len(vectors))
+        client.upsert(chunk_collection, points=models.Batch(
+            ids=list(range(start, end)),
+            vectors=vectors[start:end].tolist(),
+            payloads=[{"page_content": "", "metadata": {"source": f"doc-{d}", "chunk_id": i}}
+                      for i, d in zip(range(start, end), doc_ids[start:end])],
+        ), wait=True)
+    points = []
+    for doc in np.unique(doc_ids):
+        for i, vector in enumerate(document_vectors(vectors[doc_ids == doc], sections)):
+            points.append(models.PointStruct(id=str(uuid.uuid4()), vector=vector, payload={"source": f"doc-{doc}", "section": i}))
+    for start in range(0, len(points), UPSERT_BATCH):
+        client.upsert(doc_collection, points=points[start : start + UPSERT_BATCH], wait=True)
+
+
+def exact_top_k(vectors: np.ndarray, queries: np.ndarray, k: int, block: int = 200_000) -> np.ndarray:
+    best_scores = np.full((len(queries), 0), -np.inf, dtype=np.float32)
+    best_ids = np.zeros((len(queries), 0), dtype=np.int64)
+    for start in range(0, len(vectors), block):
+        scores = queries @ vectors[start : start + block].T
+        ids = np.broadcast_to(np.arange(start, start + scores.shape[1]), scores.shape)
+        scores, ids = np.hstack([best_scores, scores]), np.hstack([best_ids, ids])
+        top = np.argsort(-scores, axis=1)[:, :k]
+        best_scores, best_ids = np.take_along_axis(scores, top, 1), np.take_along_axis(ids, top, 1)
+    return best_ids
+
+
+def measure(search, queries, truth, k):
+    latencies, hits = [], 0
+    for query, expected in zip(queries, truth):
+        start = time.perf_counter()
+        points = search(query.tolist())
+        latencies.append(time.perf_counter() - start)
+        hits += len({int(p.id) for p in points} & set(expected.tolist()))
+    return np.percentile(latencies, 50) * 1000, np.percentile(latencies, 95) * 1000, hits / (len(queries) * k)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--url", default=os.environ.get("QDRANT_URL", "http://localhost:6333"))
+    parser.add_argument("--local", action="store_true", help="use qdrant-client's in-process mode instead of a server")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10_000, 100_000, 1_000_000])
+    parser.add_argument("--chunks-per-doc", type=int, default=100)
+    parser.add_argument("--sections", type=int, default=DOC_INDEX_SECTIONS)
+    parser.add_argument("--top-documents", type=int, default=HIERARCHICAL_TOP_DOCUMENTS)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--k", type=int, default=4)
+    args = parser.parse_args()
+
+    client = QdrantClient(location=":memory:") if args.local else QdrantClient(url=args.url, timeout=120)
+    rng = np.random.default_rng(0)
+    chunk_collection, doc_collection = "bench_hier_chunks", "bench_hier_documents"
+    print(f"k={args.k}, {args.chunks_per_doc} chunks/doc, {args.sections} sections/doc, top {args.top_documents} documents\n")
+    print(f"{'chunks':>9} {'docs':>6} {'load s':>7} | {'flat p50':>8} {'p95':>7} {'recall':>6} | {'hier p50':>8} {'p95':>7} {'recall':>6}")
+    try:
+        for size in args.sizes:
+            vectors, doc_ids = build_corpus(size, args.chunks_per_doc, args.sections, rng)
+            start = time.perf_counter()
+            load(client, chunk_collection, doc_collection, vectors, doc_ids, args.sections)
+            load_s = time.perf_counter() - start
+
+            picks = rng.integers(0, size, args.queries)
+            queries = normalize(vectors[picks] + 0.05 * rng.standard_normal((args.queries, DIM), dtype=np.float32))
+            truth = exact_top_k(vectors, queries, args.k)
+
+            flat = measure(lambda q: search_points(client, chunk_collection, q, args.k), queries, truth, args.k)
+            hier = measure(lambda q: hierarchical_search(client, chunk_collection, doc_collection, q, args.k, args.top_documents),
+                           queries, truth, args.k)
+            print(f"{size:>9} {len(np.unique(doc_ids)):>6} {load_s:>7.1f} | {flat[0]:>6.2f}ms {flat[1]:>5.2f}ms {flat[2]:>6.3f} | "
+                  f"{hier[0]:>6.2f}ms {hier[1]:>5.2f}ms {hier[2]:>6.3f}")
+    finally:
+        for name in (chunk_collection, doc_collection):
+            try:
+                client.delete_collection(name)
+            except Exception:
+                pass
+
+
+if __name__ == "__main__":
+    main()
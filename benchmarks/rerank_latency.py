@@ -0,0 +1,95 @@
+"""
+Reranking latency versus the number of candidates N and the final k.
+
+Offline (default): times the batched cross-encoder pass on synthetic passages for each N.
+Live (--live): runs the full `chatbot_rag_rerank` graph (needs Qdrant with documents and an
+OPENAI_API_KEY) for every (N, k) pair and reports end-to-end latency, next to the plain
+`chatbot_rag_lite` graph as a baseline.
+
+Usage:
+    python benchmarks/rerank_latency.py --candidates 10 20 50 100
+    python benchmarks/rerank_latency.py --live --question "What is the refund policy?" --candidates 10 20 50 --top-k 2 4 8
+"""
+import argparse
+import asyncio
+import os
+import random
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+WORDS = ("policy refund customer order shipping invoice warranty battery charger device account "
+         "password support ticket delivery address payment card subscription plan upgrade").split()
+
+
+def synthetic_passage(rng: random.Random, words: int = 180) -> str:
+    return " ".join(rng.choice(WORDS) for _ in range(words)) + "."
+
+
+def run_offline(args):
+    from langchain_core.documents import Document
+    from app import reranker
+
+    rng = random.Random(0)
+    query = "How do I get a refund for a damaged charger?"
+    reranker.get_cross_encoder()  # load outside the timed region
+    print(f"model={reranker.RERANK_MODEL} max_length={reranker.RERANK_MAX_LENGTH} threads={reranker.RERANK_THREADS}\n")
+    print(f"{'N':>5} {'median ms':>10} {'p95 ms':>8} {'ms/pair':>8}")
+    for n in args.candidates:
+        docs = [Document(page_content=synthetic_passage(rng), metadata={"source": "synthetic", "chunk_id": i}) for i in range(n)]
+        timings = []
+        for _ in range(args.repeats):
+            _, elapsed = reranker.rerank(query, docs, top_k=min(args.top_k))
+            timings.append(elapsed * 1000)
+        timings.sort()
+        p95 = timings[max(0, int(len(timings) * 0.95) - 1)]
+        median = statistics.median(timings)
+        print(f"{n:>5} {median:>10.1f} {p95:>8.1f} {median / n:>8.2f}")
+
+
+async def time_graph(agent, question: str, llm_model: str, repeats: int) -> float:
+    from app.agent import SYSTEM_PROMPT
+    from langchain_core.messages import HumanMessage, SystemMessage
+
+    timings = []
+    for _ in range(repeats):
+        inputs = {"messages": [SystemMessage(content=SYSTEM_PROMPT), HumanMessage(content=question)]}
+        start = time.perf_counter()
+        await agent.ainvoke(inputs, config={"configurable": {"llm_model_name": llm_model}})
+        timings.append((time.perf_counter() - start) * 1000)
+    return statistics.median(timings)
+
+
+async def run_live(args):
+    from app import agent as agent_module, reranker
+
+    reranker.get_cross_encoder()
+    baseline = await time_graph(agent_module.available_agents[agent_module.DEFAULT_AGENT], args.question, args.llm_model, args.repeats)
+    print(f"baseline {agent_module.DEFAULT_AGENT}: {baseline:.0f} ms\n")
+    print(f"{'N':>5} {'k':>4} {'end-to-end ms':>14}")
+    for n in args.candidates:
+        for k in args.top_k:
+            reranker.RERANK_CANDIDATES, reranker.RERANK_TOP_K = n, k
+            elapsed = await time_graph(agent_module.available_agents["chatbot_rag_rerank"], args.question, args.llm_model, args.repeats)
+            print(f"{n:>5} {k:>4} {elapsed:>14.0f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--candidates", type=int, nargs="+", default=[10, 20, 50, 100])
+    parser.add_argument("--top-k", type=int, nargs="+", default=[4])
+    parser.add_argument("--repeats", type=int, default=5)
+    parser.add_argument("--live", action="store_true")
+    parser.add_argument("--question", default="What is the refund policy?")
+    parser.add_argument("--llm-model", default="gpt-4o")
+    args = parser.parse_args()
+    if args.live:
+        asyncio.run(run_live(args))
+    else:
+        run_offline(args)
+
+
+if __name__ == "__main__":
+    main()
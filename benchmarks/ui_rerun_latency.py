@@ -0,0 +1,114 @@
+"""
+Measures the backend cost of one Streamlit rerun of the logged-in UI against a stub backend.
+
+A rerun of the logged-in app fetches the agent and character lists and the artifact list.
+The "direct" mode reproduces the old behaviour (a new `requests` connection per call, serial),
+the "client" mode uses `api_client` (pooled keep-alive session, parallel fetch, TTL cache).
+
+Usage:
+    python benchmarks/ui_rerun_latency.py --latency-ms 20 --reruns 50
+"""
+import argparse
+import json
+import os
+import statistics
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import requests
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+STUB_RESPONSES = {
+    "/v1/agents": ["chatbot_rag_lite"],
+    "/v1/characters/": [{"id": 1, "role": "Assistant", "agent_model": "chatbot_rag_lite", "voice_id": "Brian",
+                         "voice_model": "eleven_flash_v2_5", "system_prompt": "Be helpful."}],
+    "/v1/artifacts": ["handbook.pdf", "faq.pdf"],
+}
+
+
+def make_handler(latency_s: float):
+    class StubHandler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"  # allow keep-alive
+        disable_nagle_algorithm = True  # like uvicorn; avoids delayed-ACK stalls on reused connections
+
+        def do_GET(self):
+            time.sleep(latency_s)
+            body = json.dumps(STUB_RESPONSES.get(self.path, [])).encode()
+            self.send_response(200)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):
+            pass
+
+    return StubHandler
+
+
+def rerun_direct(base_url: str, headers: dict):
+    requests.get(f"{base_url}/agents", headers=headers).json()
+    requests.get(f"{base_url}/characters/", headers=headers).json()
+    requests.get(f"{base_url}/artifacts", headers=headers).json()
+
+
+def rerun_client(api_client, token: str):
+    api_client.fetch_initial_data(token)
+    api_client.list_artifacts(token)
+
+
+def measure(fn, reruns: int) -> list:
+    timings = []
+    for _ in range(reruns):
+        start = time.perf_counter()
+        fn()
+        timings.append((time.perf_counter() - start) * 1000)
+    return timings
+
+
+def report(label: str, timings: list):
+    timings = sorted(timings)
+    p95 = timings[max(0, int(len(timings) * 0.95) - 1)]
+    print(f"{label:<28} mean={statistics.mean(timings):8.2f} ms  "
+          f"median={statistics.median(timings):8.2f} ms  p95={p95:8.2f} ms")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--latency-ms", type=float, default=20.0, help="artificial server latency per request")
+    parser.add_argument("--reruns", type=int, default=50)
+    args = parser.parse_args()
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), make_handler(args.latency_ms / 1000))
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    base_url = f"http://127.0.0.1:{server.server_port}/v1"
+    os.environ["FASTAPI_BASE_URL"] = base_url
+
+    import api_client
+    from streamlit import logger as st_logger
+
+    st_logger.set_log_level("error")  # silence "no runtime" warnings in bare mode
+
+    token = "benchmark-token"
+    headers = {"Authorization": f"Bearer {token}"}
+    print(f"Stub backend latency: {args.latency_ms} ms/request, {args.reruns} reruns\n")
+    report("direct (serial, no pool)", measure(lambda: rerun_direct(base_url, headers), args.reruns))
+
+    # Cold: every rerun misses the TTL cache, so this isolates pooling + parallel fetch.
+    def cold():
+        api_client.invalidate_characters()
+        api_client.invalidate_artifacts()
+        rerun_client(api_client, token)
+    report("client (pooled, uncached)", measure(cold, args.reruns))
+
+    api_client.invalidate_characters()
+    api_client.invalidate_artifacts()
+    report("client (pooled, TTL cache)", measure(lambda: rerun_client(api_client, token), args.reruns))
+    server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
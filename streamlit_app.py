@@ -6,20 +6,22 @@ from streamlit_mermaid import st_mermaid
 from pyvis.network import Network
 import streamlit.components.v1 as components
 
+import api_client
+
 # --- Configuration ---
-FASTAPI_BASE_URL = "http://127.0.0.1:8000/v1"
-API_REGISTER_URL = f"{FASTAPI_BASE_URL}/users/register"
-API_LOGIN_URL = f"{FASTAPI_BASE_URL}/users/login"
-API_USER_ME_URL = f"{FASTAPI_BASE_URL}/users/me"
-API_CONVERSATIONS_URL = f"{FASTAPI_BASE_URL}/conversations"
-API_SYNC_MESSAGE_URL = f"{FASTAPI_BASE_URL}/conversations/message"
-API_TEXT_STREAM_URL = f"{FASTAPI_BASE_URL}/conversations/message/stream"
-API_AGENTS_URL = f"{FASTAPI_BASE_URL}/agents"
-API_AGENT_VISUALIZE_URL = f"{FASTAPI_BASE_URL}/agents/{{agent_name}}/visualize"
-API_ARTIFACTS_URL = f"{FASTAPI_BASE_URL}/artifacts"
-API_UPLOAD_URL = f"{FASTAPI_BASE_URL}/artifacts/upload"
-API_CHARACTERS_URL = f"{FASTAPI_BASE_URL}/characters"
-API_AUDIO_DOWNLOAD_URL = f"{FASTAPI_BASE_URL}/conversations/message/audio"
+# Paths are relative to api_client.FASTAPI_BASE_URL; all calls go through the shared pooled client.
+API_REGISTER_URL = "/users/register"
+API_LOGIN_URL = "/users/login"
+API_USER_ME_URL = "/users/me"
+API_CONVERSATIONS_URL = "/conversations"
+API_SYNC_MESSAGE_URL = "/conversations/message"
+API_TEXT_STREAM_URL = "/conversations/message/stream"
+API_AGENT_VISUALIZE_URL = "/agents/{agent_name}/visualize"
+API_UPLOAD_URL = "/artifacts/upload"
+API_CHARACTERS_URL = "/characters"
+API_AUDIO_DOWNLOAD_URL = "/conversations/message/audio"
+
+client = api_client.get_client()
 
 # --- Page Setup ---
 st.set_page_config(page_title="WattOS AI", layout="wide", initial_sidebar_state="expanded")
@@ -142,17 +144,16 @@ def render_upload_ui():
             with st.spinner("Uploading and processing file..."):
                 try:
                     files = {'file': (uploaded_file.name, uploaded_file, 'application/pdf')}
-                    response = requests.post(API_UPLOAD_URL, files=files, headers=get_auth_headers())
+                    response = client.post(API_UPLOAD_URL, st.session_state.token, files=files)
                     response.raise_for_status()
+                    api_client.invalidate_artifacts()
                     st.success(f"File '{uploaded_file.name}' processed successfully!")
                     st.rerun()
                 except requests.exceptions.RequestException as e: st.error(f"Upload failed: {e}")
     st.divider()
     st.subheader("Available Documents")
     try:
-        response = requests.get(API_ARTIFACTS_URL, headers=get_auth_headers())
-        response.raise_for_status()
-        files = response.json()
+        files = api_client.list_artifacts(st.session_state.token)
         if files:
             for file_name in files: st.write(f"- {file_name}")
         else: st.info("No documents have been uploaded yet.")
@@ -167,7 +168,7 @@ def render_agent_models_ui():
                 with st.spinner("Fetching visualization..."):
                     try:
                         url = API_AGENT_VISUALIZE_URL.format(agent_name=selected)
-                        res = requests.get(url, headers=get_auth_headers())
+                        res = client.get(url, st.session_state.token)
                         res.raise_for_status()
                         mermaid_text = res.json()["mermaid_text"]
                         st_mermaid(mermaid_text)
@@ -189,10 +190,10 @@ def render_account_settings_ui():
 # --- Helper Functions ---
 def handle_login(username, password):
     try:
-        res = requests.post(API_LOGIN_URL, data={"username": username, "password": password})
+        res = client.post(API_LOGIN_URL, data={"username": username, "password": password})
         if res.ok:
             st.session_state.token = res.json()["access_token"]
-            user_info_res = requests.get(API_USER_ME_URL, headers=get_auth_headers())
+            user_info_res = client.get(API_USER_ME_URL, st.session_state.token)
             if user_info_res.ok: st.session_state.user = user_info_res.json()
             st.rerun()
         else: st.sidebar.error("Login failed.")
@@ -200,7 +201,7 @@ def handle_login(username, password):
 
 def handle_register(username, password):
     try:
-        res = requests.post(API_REGISTER_URL, json={"username": username, "password": password})
+        res = client.post(API_REGISTER_URL, json={"username": username, "password": password})
         if res.ok: st.sidebar.success("Registered! Please log in.")
         elif res.status_code == 422: st.sidebar.error("Password must be 8-64 chars.")
         else: st.sidebar.error(f"Failed: {res.json().get('detail', 'Unknown')}")
@@ -208,7 +209,7 @@ def handle_register(username, password):
 
 def handle_create_character(payload):
     try:
-        res = requests.post(API_CHARACTERS_URL, json=payload, headers=get_auth_headers())
+        res = client.post(f"{API_CHARACTERS_URL}/", st.session_state.token, json=payload)
         res.raise_for_status()
         st.success(f"Character '{payload['role']}' created!")
         fetch_initial_data(force=True)
@@ -217,7 +218,7 @@ def handle_create_character(payload):
 
 def handle_update_character(char_id, payload):
     try:
-        res = requests.put(f"{API_CHARACTERS_URL}/{char_id}", json=payload, headers=get_auth_headers())
+        res = client.put(f"{API_CHARACTERS_URL}/{char_id}", st.session_state.token, json=payload)
         res.raise_for_status()
         st.success(f"Character ID {char_id} updated!")
         fetch_initial_data(force=True)
@@ -226,7 +227,7 @@ def handle_update_character(char_id, payload):
 
 def handle_delete_character(char_id):
     try:
-        res = requests.delete(f"{API_CHARACTERS_URL}/{char_id}", headers=get_auth_headers())
+        res = client.delete(f"{API_CHARACTERS_URL}/{char_id}", st.session_state.token)
         res.raise_for_status()
         st.success(f"Character ID {char_id} deleted!")
         fetch_initial_data(force=True)
@@ -235,16 +236,14 @@ def handle_delete_character(char_id):
 
 def handle_update_user(payload):
     try:
-        res = requests.put(API_USER_ME_URL, json=payload, headers=get_auth_headers())
+        res = client.put(API_USER_ME_URL, st.session_state.token, json=payload)
         res.raise_for_status()
         st.success("Password updated successfully!")
     except requests.RequestException: st.error("Failed to update password.")
 
-def get_auth_headers(): return {"Authorization": f"Bearer {st.session_state.token}"}
-
 def start_new_conversation():
     try:
-        res = requests.post(API_CONVERSATIONS_URL, headers=get_auth_headers())
+        res = client.post(API_CONVERSATIONS_URL, st.session_state.token)
         res.raise_for_status()
         st.session_state.thread_id = res.json()["thread_id"]
         st.session_state.messages = [{"role": "assistant", "content": "Hello! How can I assist you today?"}]
@@ -255,7 +254,7 @@ def start_new_conversation():
 def handle_text_response(prompt):
     payload = {"thread_id": st.session_state.thread_id, "message": prompt, "character": st.session_state.character, "llm_model": st.session_state.llm_model}
     try:
-        with requests.post(API_TEXT_STREAM_URL, json=payload, headers=get_auth_headers(), stream=True) as res:
+        with client.post(API_TEXT_STREAM_URL, st.session_state.token, json=payload, stream=True) as res:
             res.raise_for_status()
             for line in res.iter_lines():
                 if line and line.decode().startswith("data:"):
@@ -269,11 +268,11 @@ def handle_audio_response(prompt):
     try:
         with st.spinner("Thinking and generating audio..."):
             payload = {"thread_id": st.session_state.thread_id, "message": prompt, "character": st.session_state.character, "llm_model": st.session_state.llm_model}
-            text_res = requests.post(API_SYNC_MESSAGE_URL, json=payload, headers=get_auth_headers())
+            text_res = client.post(API_SYNC_MESSAGE_URL, st.session_state.token, json=payload)
             text_res.raise_for_status()
             text_data = text_res.json()["response"]
             audio_payload = {"message": text_data}
-            audio_res = requests.post(API_AUDIO_DOWNLOAD_URL, json=audio_payload, headers=get_auth_headers())
+            audio_res = client.post(API_AUDIO_DOWNLOAD_URL, st.session_state.token, json=audio_payload)
             audio_res.raise_for_status()
             audio_bytes = audio_res.content
             return text_data, audio_bytes
@@ -288,20 +287,18 @@ def logout(rerun=True):
     if rerun: st.rerun()
 
 def fetch_initial_data(force=False):
-    if force or not st.session_state.agent_models or not st.session_state.characters:
-        headers = get_auth_headers()
-        try:
-            agents_res = requests.get(API_AGENTS_URL, headers=headers)
-            if agents_res.ok: st.session_state.agent_models = agents_res.json()
-            chars_res = requests.get(API_CHARACTERS_URL, headers=headers)
-            if chars_res.ok: st.session_state.characters = chars_res.json()
-        except requests.RequestException: st.error("Failed to fetch initial data from backend.")
+    # Agents and characters are fetched in parallel and cached for a short TTL, so reruns are cheap.
+    if force: api_client.invalidate_characters()
+    try:
+        data = api_client.fetch_initial_data(st.session_state.token)
+        st.session_state.agent_models = data["agents"]
+        st.session_state.characters = data["characters"]
+    except requests.RequestException: st.error("Failed to fetch initial data from backend.")
 
 # --- Main App Logic ---
 if st.session_state.token is None:
     login_register_ui()
 else:
-    if not st.session_state.agent_models or not st.session_state.characters:
-        fetch_initial_data()
+    fetch_initial_data()
     chat_controls_ui()
     main_chat_area()
\ No newline at end of file